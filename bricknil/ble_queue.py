@@ -58,10 +58,10 @@ class BLEventQ(Process):
         try:
             while True:
                 msg = await self.q.get()
-                msg_type, hub, msg_val = msg
+                msg_type, hub, msg_val, response = msg
                 await self.q.task_done()
-                self.message_debug(f'Got msg: {msg_type} = {msg_val}')
-                await self.send_message(hub.tx, msg_val)
+                self.message_debug('Got msg: %s = %s', msg_type, msg_val)
+                await self.send_message(hub.tx, msg_val, response)
         except CancelledError:
             self.message(f'Terminating and disconnecxting')
             if USE_BLEAK:
@@ -69,21 +69,23 @@ class BLEventQ(Process):
             else:
                 self.device.disconnect()
 
-    async def send_message(self, characteristic, msg):
+    async def send_message(self, characteristic, msg, response=True):
         """Prepends a byte with the length of the msg and writes it to
            the characteristic
 
            Arguments:
               characteristic : An object from bluefruit, or if using Bleak,
                   a tuple (device, uuid : str)
-              msg (bytearray) : Message with header
+              msg (bytes or list) : Message with header
+              response (bool) : Set to False to skip waiting for the GATT write response (Bleak only)
         """
         # Message needs to have length prepended
         length = len(msg)+1
-        values = bytearray([length]+msg)
+        values = bytearray([length])
+        values.extend(msg)
         if USE_BLEAK:
             device, char_uuid = characteristic
-            await self.ble.in_queue.put( ('tx', (device, char_uuid, values)) )
+            await self.ble.in_queue.put( ('tx', (device, char_uuid, values, response)) )
         else:
             characteristic.write_value(values)
 
@@ -99,13 +101,13 @@ class BLEventQ(Process):
         msg_parser.parse(bytearray([15, 0x00, 0x04,255, 1, Button._sensor_id, 0x00, 0,0,0,0, 0,0,0,0]))
 
         def bleak_received(sender, data):
-            self.message_debug(f'Bleak Raw data received: {data}')
+            self.message_debug('Bleak Raw data received: %s', data)
             msg = msg_parser.parse(data)
-            self.message_debug('{0} Received: {1}'.format(hub.name, msg))
+            self.message_debug('%s Received: %s', hub.name, msg)
         def received(data):
-            self.message_debug(f'Adafruit_Bluefruit Raw data received: {data}')
+            self.message_debug('Adafruit_Bluefruit Raw data received: %s', data)
             msg = msg_parser.parse(data)
-            self.message_debug('{0} Received: {1}'.format(hub.name, msg))
+            self.message_debug('%s Received: %s', hub.name, msg)
 
         if USE_BLEAK:
             device, char_uuid = hub.tx
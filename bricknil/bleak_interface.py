@@ -18,6 +18,8 @@
 import curio, asyncio, threading, logging
 
 import bleak
+
+logger = logging.getLogger(str(__name__))
 #from bleak import BleakClient
 
 class Bleak:
@@ -61,9 +63,9 @@ class Bleak:
                 msg, val = msg
             await self.in_queue.task_done()
             if msg == 'discover':
-                print('Awaiting on bleak discover')
+                logger.debug('Awaiting on bleak discover')
                 devices = await bleak.discover(timeout=1, loop=self.loop)
-                print('Done Awaiting on bleak discover')
+                logger.debug('Done Awaiting on bleak discover')
                 await self.out_queue.put(devices)
             elif msg == 'connect':
                 device = bleak.BleakClient(address=val, loop=self.loop)
@@ -71,20 +73,21 @@ class Bleak:
                 await device.connect()
                 await self.out_queue.put(device)
             elif msg == 'tx':
-                device, char_uuid, msg_bytes = val
-                await device.write_gatt_char(char_uuid, msg_bytes)
+                device, char_uuid, msg_bytes, response = val
+                # Fire-and-forget commands (like speed ramp steps) are written
+                # without waiting for a GATT write response
+                await device.write_gatt_char(char_uuid, msg_bytes, response=response)
             elif msg == 'notify':
                 device, char_uuid, msg_handler = val
                 await device.start_notify(char_uuid, msg_handler)
             elif msg =='quit':
-                print("quitting")
-                logging.info('quitting')
+                logger.info('quitting')
                 for device in self.devices:
                     await device.disconnect()
                 done = True
-                print("quit")
+                logger.info('quit')
             else:
-                print(f'Unknown message to Bleak: {msg}')
+                logger.error('Unknown message to Bleak: %s', msg)
 
 
 
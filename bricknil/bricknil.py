@@ -32,7 +32,7 @@ from .process import Process
 from .ble_queue import BLEventQ
 from .hub import PoweredUpHub, BoostHub, Hub
 from .const import USE_BLEAK
-from .sockets import bricknil_socket_server
+from .sockets import bricknil_socket_server, WEB_QUEUE_SIZE
 
 #if USE_BLEAK:
     #from .bleak_interface import Bleak
@@ -81,23 +81,31 @@ class attach:
             Inside that wrapper, we do the following:
             
             # Instance the peripheral that was decorated with the saved **kwargs
-            # Check that any `sense_*` capabiilities in the peripheral have an 
-              appropriate handler method in the hub class being decorated.
             # Instance the Hub
             # Set the peripheral instance as an instance variable on the hub via the
               `Hub.attach_sensor` method
 
+            The capabilities are resolved, and any `sense_*` capabilities checked for an 
+            appropriate handler method in the hub class being decorated, only once here
+            at decoration time instead of on every instantiation.
+
         """
+        peripheral_kwargs = dict(self.kwargs)
+        if peripheral_kwargs.get('capabilities'):
+            caps, thresholds = self.peripheral_type._get_validated_capabilities(peripheral_kwargs['capabilities'])
+            # Already-resolved (enum, threshold) pairs are accepted by the Peripheral as-is
+            peripheral_kwargs['capabilities'] = list(zip(caps, thresholds))
+            # Ugly, but scan through and check if any of the capabilities are sense_*
+            if any(cap.name.startswith('sense') for cap in caps):
+                handler_name = f'{peripheral_kwargs.get("name")}_change'
+                assert hasattr(cls, handler_name), f'{cls.__name__} needs a handler {handler_name}'
+
         # Define a wrapper function to capture the actual instantiation and __init__ params
         @wraps(cls)
         def wrapper_f(*args, **kwargs):
             #print(f'type of cls is {type(cls)}')
-            peripheral = self.peripheral_type(**self.kwargs)
+            peripheral = self.peripheral_type(**peripheral_kwargs)
 
-            # Ugly, but scan through and check if any of the capabilities are sense_*
-            if any([cap.name.startswith('sense') for cap in peripheral.capabilities]):
-                handler_name = f'{peripheral.name}_change'
-                assert hasattr(cls, handler_name), f'{cls.__name__} needs a handler {handler_name}'
             # Create the hub process and attach this peripheral
             o = cls(*args, **kwargs)
             o.message_debug(f"Decorating class {cls.__name__} with {self.peripheral_type.__name__}")
@@ -115,8 +123,8 @@ async def _run_all(ble, system):
     print('inside curio run loop')
     # Instantiate the Bluetooth LE handler/queue
     ble_q = BLEventQ(ble)
-    # The web client out_going queue
-    web_out_queue = Queue()
+    # The web client out_going queue (bounded, WebMessage drops the oldest when full)
+    web_out_queue = Queue(maxsize=WEB_QUEUE_SIZE)
     # Instantiate socket listener
     #task_socket = await spawn(socket_server, web_out_queue, ('',25000))
     task_tcp = await spawn(bricknil_socket_server, web_out_queue, ('',25000))
@@ -45,6 +45,7 @@ class Hub(Process):
             peripherals (dict) : Peripheral name => `bricknil.Peripheral`
             port_to_peripheral (dict): Port number(int) -> `bricknil.Peripheral`
             port_info (dict):  Keeps track of all the meta-data for each port.  Usually not populated unless `query_port_info` is true
+            change_handlers (dict): Peripheral name -> its `<name>_change` handler, bound when the peripheral is attached
 
     """
     hubs = []
@@ -61,6 +62,7 @@ class Hub(Process):
         self.peripherals = {}  # attach_sensor method will add sensors to this
         self.port_to_peripheral = {}   # Quick mapping from a port number to a peripheral object
                                         # Only gets populated once the peripheral attaches itself physically
+        self.change_handlers = {}   # Peripheral name -> its bound `<name>_change` handler (set by attach_sensor)
         self.peripheral_queue = UniversalQueue()  # Incoming messages from peripherals
 
         # Keep track of port info as we get messages from the hub ('update_port' messages)
@@ -76,15 +78,19 @@ class Hub(Process):
         self.web_message = WebMessage(self)
 
 
-    async def send_message(self, msg_name, msg_bytes, peripheral=None):
+    async def send_message(self, msg_name, msg_bytes, peripheral=None, response=True):
         """Insert a message to the hub into the queue(:func:`bricknil.hub.Hub.message_queue`) connected to our BLE
            interface
 
+           Args:
+              response (bool) : Set to False for fire-and-forget messages that don't need to
+                wait for a BLE write response
+
         """
 
         while not self.tx:  # Need to make sure we have a handle to the uart
             await sleep(1)
-        await self.message_queue.put((msg_name, self, msg_bytes))
+        await self.message_queue.put((msg_name, self, msg_bytes, response))
         if self.web_queue_out and peripheral:
             cls_name = peripheral.__class__.__name__
             await self.web_message.send(peripheral, msg_name)
@@ -109,22 +115,21 @@ class Hub(Process):
                     port, msg_bytes = data
                     peripheral = self.port_to_peripheral[port]
                     await peripheral.update_value(msg_bytes)
-                    self.message_debug(f'peripheral msg: {peripheral} {msg}')
+                    self.message_debug('peripheral msg: %s %s', peripheral, msg)
                     if self.web_queue_out:
-                        cls_name = peripheral.__class__.__name__
                         if len(peripheral.capabilities) > 0:
-                            for cap in peripheral.value:
-                                await self.web_message.send(peripheral, f'value change mode: {cap.value} = {peripheral.value[cap]}')
+                            for cap, val in peripheral.value.items():
+                                await self.web_message.send_value(peripheral, cap, val)
                                 #await self.web_queue_out.put( f'{self.name}|{cls_name}|{peripheral.name}|{peripheral.port}|value change mode: {cap.value} = {peripheral.value[cap]}\r\n'.encode('utf-8') )
-                    handler_name = f'{peripheral.name}_change'
-                    handler = getattr(self, handler_name)
-                    await handler()
+                    handler = self.change_handlers.get(peripheral.name)
+                    if handler:
+                        await handler()
                 elif msg == 'attach':
                     port, device_name = data
                     peripheral = await self.connect_peripheral_to_port(device_name, port)
                     if peripheral:
-                        self.message_debug(f'peripheral msg: {peripheral} {msg}')
-                        peripheral.message_handler = self.send_message
+                        self.message_debug('peripheral msg: %s %s', peripheral, msg)
+                        await peripheral.set_message_handler(self.send_message)
                         await peripheral.activate_updates()
                 elif msg == 'update_port':
                     port, info = data
@@ -177,12 +182,23 @@ class Hub(Process):
         """Add instance variable for this decorated sensor
 
            Called by the class decorator :class:`bricknil.bricknil.attach` when decorating the sensor
+
+           The sensor's `<name>_change` handler is looked up here, once, and that bound
+           method is what gets called on every value change.  Assigning a different
+           `<name>_change` on the instance afterwards has no effect; to swap handlers at
+           run time, replace the entry in `change_handlers` instead.
         """
         # Check that we don't already have a sensor with the same name attached
         assert sensor.name not in self.peripherals, f'Duplicate {sensor.name} found!'
         self.peripherals[sensor.name] = sensor
         # Put this sensor as an attribute
         setattr(self, sensor.name, sensor)
+        handler = getattr(self, f'{sensor.name}_change', None)
+        if not callable(handler):
+            # Only peripherals with sense_* capabilities need a handler (`attach` checks
+            # for it), so there's nothing to call when this one reports a value
+            return
+        self.change_handlers[sensor.name] = handler
 
     async def _get_port_info(self, port, msg):
         """Utility function to query information on available ports and modes from a hub.
@@ -190,7 +206,7 @@ class Hub(Process):
         """
         if msg == 'port_detected':
             # Request mode info
-            b = [0x00, 0x21, port, 0x01]
+            b = bytes((0x00, 0x21, port, 0x01))
             await self.send_message(f'req mode info on {port}', b)
         elif msg == 'port_combination_info_received':
             pass
@@ -202,7 +218,7 @@ class Hub(Process):
             modes = self.port_info[port]['modes']
             if self.port_info[port].get('combinable', False):
                 # Get combination info on port
-                b = [0x00, 0x21, port, 0x02]
+                b = bytes((0x00, 0x21, port, 0x02))
                 await self.send_message(f'req mode combination info on {port}', b)
             for mode in modes.keys():
                 info_types = { 'NAME': 0, 'VALUE FORMAT':0x80, 'RAW Range':0x01,
@@ -211,7 +227,7 @@ class Hub(Process):
                         }
                 # Send a message to requeust each type of info 
                 for k,v in info_types.items():
-                    b = [0x00, 0x22, port, mode, v]
+                    b = bytes((0x00, 0x22, port, mode, v))
                     await self.send_message(f'req info({k}) on mode {mode} {port}', b)
 
 
@@ -63,7 +63,7 @@ class PortValueMessage(Message):
 
     def parse(self, msg_bytes, l, dispatcher):
         port = msg_bytes.pop(0)
-        dispatcher.message_update_value_to_peripheral(port,  msg_bytes)
+        dispatcher.message_update_value_to_peripheral(port,  bytes(msg_bytes))
         l.append(f'Port {port} changed value to {msg_bytes}')
 
 class PortComboValueMessage(Message):
@@ -73,7 +73,7 @@ class PortComboValueMessage(Message):
 
     def parse(self, msg_bytes, l, dispatcher):
         port = msg_bytes.pop(0)
-        dispatcher.message_update_value_to_peripheral(port,  msg_bytes)
+        dispatcher.message_update_value_to_peripheral(port,  bytes(msg_bytes))
         l.append(f'Port {port} changed combo value to {msg_bytes}')
 
 class HubPropertiesMessage(Message):
@@ -47,24 +47,28 @@ class Process:
     def __repr__(self):
         return f'{type(self).__name__}("{self.name}")'
 
-    def message(self, m : str , level = logging.INFO):
-        """Print message *m* if its level is lower than the instance level"""
+    def message(self, m : str, *args, level = logging.INFO):
+        """Print message *m* if its level is lower than the instance level
+
+           Any extra *args* are %-formatted into *m* by the logger only if the
+           message is actually going to be emitted.
+        """
 
         if level == logging.DEBUG:
-            self.logger.debug(m)
+            self.logger.debug(m, *args)
         elif level == logging.INFO:
-            self.logger.info(m)
+            self.logger.info(m, *args)
         elif level == logging.ERROR:
-            self.logger.error(m)
+            self.logger.error(m, *args)
 
-    def message_info(self, m):
+    def message_info(self, m, *args):
         """Helper function for logging messages at INFO level"""
-        self.message(m, logging.INFO)
+        self.message(m, *args, level=logging.INFO)
 
-    def message_debug(self, m):
+    def message_debug(self, m, *args):
         """Helper function for logging messages at DEBUG level"""
-        self.message(m, logging.DEBUG)
+        self.message(m, *args, level=logging.DEBUG)
 
-    def message_error(self, m):
+    def message_error(self, m, *args):
         """Helper function for logging messages at ERROR level"""
-        self.message(m, logging.ERROR)
+        self.message(m, *args, level=logging.ERROR)
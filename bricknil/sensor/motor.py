@@ -13,10 +13,11 @@
 # limitations under the License.
 """All motor related peripherals including base motor classes"""
 
-from curio import sleep, current_task, spawn  # Needed for motor speed ramp
+from curio import current_task, spawn, clock, wake_at, disable_cancellation, CancelledError  # Needed for motor speed ramp
 
 from enum import Enum
-from struct import pack
+from math import ceil
+from struct import Struct
 
 from .peripheral import Peripheral
 
@@ -24,11 +25,26 @@ class Motor(Peripheral):
     """Utility class for common functions shared between Train Motors, Internal Motors, and External Motors
 
     """
-    def __init__(self, name, port=None, capabilities=[]):
+    _SPEED_LUT = tuple(speed & 255 for speed in range(-100, 101))
+    """Pre-computed byte values for speeds -100 to 100 (negative speeds are two's complement)"""
+    _RAMP_STEP_MS = 100
+    """Time between the speed updates of a ramp"""
+
+    def __init__(self, name, port=None, capabilities=None):
         self.speed = 0  # Initialize current speed to 0
         self.ramp_in_progress_task = None
         super().__init__(name, port, capabilities)
 
+    def _convert_speed_to_val(self, speed):
+        """Look up the byte value for speeds in the normal -100 to 100 range
+
+           Anything outside that range (like 127 for braking) goes through the
+           regular conversion in :class:`Peripheral`
+        """
+        if -100 <= speed <= 100:
+            return self._SPEED_LUT[speed+100]
+        return super()._convert_speed_to_val(speed)
+
     async def set_speed(self, speed):
         """ Validate and set the train speed
 
@@ -41,9 +57,17 @@ class Motor(Peripheral):
                     255 will do a hard brake
         """
         await self._cancel_existing_differet_ramp()
+        self.message_info('Setting speed to %s', speed)
+        await self._set_speed_raw(speed)
+
+    async def _set_speed_raw(self, speed, feedback=True):
+        """Set the speed without checking for an in-progress ramp
+
+           Only the ramp task itself should call this directly, since it already
+           knows it's the ramp in progress.
+        """
         self.speed = speed
-        self.message_info(f'Setting speed to {speed}')
-        await self.set_output(0, self._convert_speed_to_val(speed))
+        await self.set_output(0, self._convert_speed_to_val(speed), feedback)
         
     async def _cancel_existing_differet_ramp(self):
         """Cancel the existing speed ramp if it was from a different task
@@ -60,41 +84,98 @@ class Motor(Peripheral):
                 # outside a previously in-progress ramp, so cancel the previous ramp
                 await self.ramp_in_progress_task.cancel()
                 self.ramp_in_progress_task = None
-                self.message_debug(f'Canceling previous speed ramp in progress')
+                self.message_debug('Canceling previous speed ramp in progress')
 
 
     async def ramp_speed(self, target_speed, ramp_time_ms):
         """Ramp the speed by 10 units in the time given in milliseconds
 
         """
-        TIME_STEP_MS = 100 
         await self._cancel_existing_differet_ramp()
+        start_speed = self.speed
+        # Precompute the whole speed schedule up front so the ramp task only
+        # has to walk through it
+        speeds = self._ramp_speeds(start_speed, target_speed, ramp_time_ms)
+
+        async def _ramp_speed():
+            # We're already the ramp task, so skip the cancel check in set_speed
+            await self._walk_ramp(await clock(), speeds)
+            # Don't let a cancel leave the motor stranded part way to its final speed
+            async with disable_cancellation():
+                self.message_info('Setting speed to %s', target_speed)
+                await self._set_speed_raw(target_speed)
+                self.ramp_in_progress_task = None
+
+        self.message_debug('Starting ramp of speed: %s -> %s (%ss)', start_speed, target_speed, ramp_time_ms/1000)
+        self.ramp_in_progress_task = await spawn(_ramp_speed, daemon = True)
+
+    def _ramp_speeds(self, start_speed, target_speed, ramp_time_ms):
+        """Return the speeds to step through, one every `_RAMP_STEP_MS`, on a ramp to *target_speed*"""
         assert ramp_time_ms > 100, f'Ramp speed time must be greater than 100ms ({ramp_time_ms}ms used)'
 
         # 500ms ramp time, 100ms per step
         # Therefore, number of steps = 500/100 = 5
         # Therefore speed_step = speed_diff/5
-        number_of_steps = ramp_time_ms/TIME_STEP_MS
-        speed_diff = target_speed - self.speed
+        number_of_steps = ramp_time_ms/self._RAMP_STEP_MS
+        speed_diff = target_speed - start_speed
         speed_step = speed_diff/number_of_steps
-        start_speed = self.speed
-        self.message_debug(f'ramp_speed steps: {number_of_steps}, speed_diff: {speed_diff}, speed_step: {speed_step}')
-        current_step = 0
-        async def _ramp_speed():
-            nonlocal current_step  # Since this is being assigned to, we need to mark it as coming from the enclosed scope
-            while current_step < number_of_steps:
-                next_speed = int(start_speed + current_step*speed_step)
-                self.message_debug(f'Setting next_speed: {next_speed}')
-                current_step +=1 
-                if current_step == number_of_steps: 
-                    next_speed = target_speed
-                await self.set_speed(next_speed)
-                await sleep(TIME_STEP_MS/1000)
-            await self.set_speed(target_speed)
+        self.message_debug('ramp_speed steps: %s, speed_diff: %s, speed_step: %s', number_of_steps, speed_diff, speed_step)
+        speeds = [int(start_speed + i*speed_step) for i in range(ceil(number_of_steps))]
+        if len(speeds) == number_of_steps:
+            speeds[-1] = target_speed
+        return tuple(speeds)
+
+    async def _walk_ramp(self, start_time, speeds):
+        """Send each of *speeds* in turn, one `_RAMP_STEP_MS` slot after *start_time* each"""
+        # Wake up on absolute deadlines so the time spent sending each step
+        # doesn't accumulate into the overall ramp time
+        for step, next_speed in enumerate(speeds, 1):
+            deadline = start_time + step*self._RAMP_STEP_MS/1000
+            if await clock() >= deadline:
+                # We got held up (e.g. by a burst of sensor updates) past this
+                # step's slot, so drop it and catch up with the schedule
+                continue
+            await self._set_speed_raw(next_speed, feedback=False)
+            await wake_at(deadline)
+
+    async def play_schedule(self, schedule):
+        """Ramp through a sequence of speeds, holding each one for a while
+
+           The whole schedule runs in one ramp task (like `ramp_speed`), and this returns
+           once the last step's hold is over.  Like a ramp, a `set_speed` or `ramp_speed`
+           from another task cancels the rest of the schedule.  Every step starts on an
+           absolute deadline measured from the start of the schedule, so time spent
+           sending commands doesn't add up over a long schedule.
+
+           Args:
+                schedule (iterable of (int, int, int)) : Steps of (target_speed, ramp_time_ms, hold_ms).
+                    The ramp starts at the beginning of each step, and the next step
+                    starts hold_ms later (so hold_ms should be longer than ramp_time_ms)
+        """
+        await self._cancel_existing_differet_ramp()
+
+        async def _play_schedule():
+            step_start = await clock()
+            for target_speed, ramp_time_ms, hold_ms in schedule:
+                self.message_debug('Schedule step: speed %s in %sms, hold %sms', target_speed, ramp_time_ms, hold_ms)
+                await self._walk_ramp(step_start, self._ramp_speeds(self.speed, target_speed, ramp_time_ms))
+                self.message_info('Setting speed to %s', target_speed)
+                await self._set_speed_raw(target_speed)
+                step_start += hold_ms/1000
+                await wake_at(step_start)
             self.ramp_in_progress_task = None
 
-        self.message_debug(f'Starting ramp of speed: {start_speed} -> {target_speed} ({ramp_time_ms/1000}s)')
-        self.ramp_in_progress_task = await spawn(_ramp_speed, daemon = True)
+        task = await spawn(_play_schedule, daemon = True)
+        self.ramp_in_progress_task = task
+        try:
+            # Returns early (without an error) if another speed command cancels the schedule
+            await task.wait()
+        except CancelledError:
+            # Don't leave the schedule playing once nobody is waiting on it
+            await task.cancel()
+            if self.ramp_in_progress_task is task:
+                self.ramp_in_progress_task = None
+            raise
 
 class TachoMotor(Motor):
 
@@ -111,6 +192,9 @@ class TachoMotor(Motor):
                       capability.sense_pos,
                     ]
 
+    _PORT_OUTPUT_INT32 = Struct('<BBBBBiBBBB')
+    """Port Output command frame with an int32 argument followed by speed, max_power, endstate, and profile"""
+
     async def set_pos(self, pos, speed=50, max_power=50):
         """Set the absolute position of the motor
 
@@ -147,10 +231,9 @@ class TachoMotor(Motor):
                 * Use Accel profile = (bit 0 = acc profile, bit 1 = decc profile)
                 *
         """
-        abs_pos = list(pack('i', pos))
         speed = self._convert_speed_to_val(speed)
 
-        b = [0x00, 0x81, self.port, 0x01, 0x0d] + abs_pos + [speed, max_power, 126, 3]
+        b = self._PORT_OUTPUT_INT32.pack(0x00, 0x81, self.port, 0x01, 0x0d, pos, speed, max_power, 126, 3)
         await self.send_message(f'set pos {pos} with speed {speed}', b)
 
 
@@ -183,10 +266,9 @@ class TachoMotor(Motor):
                 * Use Accel profile = (bit 0 = acc profile, bit 1 = decc profile)
                 *
         """
-        degrees = list(pack('i', degrees))
         speed = self._convert_speed_to_val(speed)
 
-        b = [0x00, 0x81, self.port, 0x01, 0x0b] + degrees + [speed, max_power, 126, 3]
+        b = self._PORT_OUTPUT_INT32.pack(0x00, 0x81, self.port, 0x01, 0x0b, degrees, speed, max_power, 126, 3)
         await self.send_message(f'rotate {degrees} deg with speed {speed}', b)
 
 
@@ -202,9 +284,9 @@ class TachoMotor(Motor):
         lo = zero_100_ramp_time_ms & 255
 
         profile = 1
-        b = [0x00, 0x81, self.port, 0x01, 0x05, 10, 10, profile]
+        b = bytes([0x00, 0x81, self.port, 0x01, 0x05, 10, 10, profile])
         await self.send_message(f'set accel profile {zero_100_ramp_time_ms} {hi} {lo} ', b)
-        b = [0x00, 0x81, self.port, 0x01, 0x07, self._convert_speed_to_val(target_speed), 80, 1]
+        b = bytes([0x00, 0x81, self.port, 0x01, 0x07, self._convert_speed_to_val(target_speed), 80, 1])
         await self.send_message('set speed', b)
 
 
@@ -249,12 +331,13 @@ class InternalMotor(TachoMotor):
     Port = Enum('Port', 'A B AB', start=0)
     """Address either motor A or Motor B, or both AB at the same time"""
 
-    def __init__(self, name, port=None, capabilities=[]):
+    _PORT_MAP = {Port.A: 55, Port.B: 56, Port.AB: 57}
+    """Hard-coded hub port numbers for each `Port`"""
+
+    def __init__(self, name, port=None, capabilities=None):
         """Maps the port names `A`, `B`, `AB` to hard-coded port numbers"""
         if port:
-            port_map = [55, 56, 57]
-            port = port_map[port.value]
-        self.speed = 0
+            port = self._PORT_MAP[port]
         super().__init__(name, port, capabilities)
     
         
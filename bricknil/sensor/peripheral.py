@@ -17,12 +17,40 @@
 """
 import struct
 from enum import Enum
-from collections import namedtuple
+from typing import NamedTuple
+from functools import lru_cache
 
 from ..process import Process
-from curio import sleep, spawn, current_task
+from curio import spawn, current_task, Event
 from ..const import DEVICES
 
+@lru_cache(maxsize=None)
+def _get_struct(fmt):
+    """Return the compiled `struct.Struct` for *fmt*, shared across all peripherals"""
+    return struct.Struct(fmt)
+
+_U16 = _get_struct('<H')
+_U32 = _get_struct('<I')
+_U16_from = _U16.unpack_from
+_U32_from = _U32.unpack_from
+_S8_from = _get_struct('<b').unpack_from
+_S16_from = _get_struct('<h').unpack_from
+_S32_from = _get_struct('<i').unpack_from
+
+_UNPACKERS = { (1, False): lambda msg, offset: msg[offset],
+               (2, False): lambda msg, offset: _U16_from(msg, offset)[0],
+               (4, False): lambda msg, offset: _U32_from(msg, offset)[0],
+               (1, True):  lambda msg, offset: _S8_from(msg, offset)[0],
+               (2, True):  lambda msg, offset: _S16_from(msg, offset)[0],
+               (4, True):  lambda msg, offset: _S32_from(msg, offset)[0],
+             }
+"""Functions to read an 8/16/32-bit int at an offset in a message, keyed by (byte width, signed)"""
+
+_STRUCT_CODES = { (1, False): 'B', (2, False): 'H', (4, False): 'I',
+                  (1, True):  'b', (2, True):  'h', (4, True):  'i',
+                }
+"""struct format character for each (byte width, signed)"""
+
 
 class Peripheral(Process):
     """Abstract base class for any Lego Boost/PoweredUp/WeDo peripherals
@@ -77,22 +105,65 @@ class Peripheral(Process):
             value (dict) : Sensor readings get dumped into this dict
             message_handler (func) : Outgoing message queue to `BLEventQ` that's set by the Hub when an attach message is seen
             capabilites (list [ `capability` ]) : Support capabilities 
+            _cap_mask (int) : Bit mask of the enabled capabilities, with bit `cap.value` set for each one
             thresholds (list [ int ]) : Integer list of thresholds for updates for each of the sensing capabilities
 
     """
     _DEFAULT_THRESHOLD = 1
-    Dataset = namedtuple('Dataset', ['n', 'w', 'min', 'max'])
-
-    def __init__(self, name, port=None, capabilities=[]):
+    class Dataset(NamedTuple):
+        """Number of datasets, byte width and value range of a capability"""
+        n: int
+        w: int
+        min: int = 0
+        max: int = 0
+        signed: bool = False    # Unsigned unless specified
+
+    _PORT_OUTPUT = struct.Struct('<BBBBBBB')
+    """Port Output WriteDirectModeData frame with a single byte value"""
+    _PORT_INPUT_FORMAT_SETUP = struct.Struct('<BBBBIB')
+    """Port Input Format Setup (Single) frame: mode, uint32 delta threshold, notification enable"""
+
+    def __init__(self, name, port=None, capabilities=None):
         super().__init__(name)
         self.port = port
         self.sensor_name = DEVICES[self._sensor_id]
         self.value = None
         self.message_handler = None
+        self._message_handler_ready = Event()
         self.web_queue_output = None
+        if capabilities is None:
+            capabilities = []
         self.capabilities, self.thresholds = self._get_validated_capabilities(capabilities)
+        # Bit (1 << cap.value) is set for every enabled capability
+        self._cap_mask = sum(1 << cap.value for cap in self.capabilities)
+        # (n_datasets, byte_count, signed) for each capability, in the same order as self.capabilities
+        self._cap_spec = tuple( (*self.datasets[cap][0:2], getattr(self.datasets[cap], 'signed', False))
+                                for cap in self.capabilities )
+        self._parse_plan = self._build_parse_plan()
+        # Mode/dataset report order for combo mode (mode is the higher order nibble,
+        # dataset is the lower order nibble).  Only the port isn't known until attach time
+        self._combo_order = bytes(16*cap.value + (dataset or 0) for cap, dataset, *_ in self._parse_plan)
+        # The number of capabilities is fixed, so pick the update_value parser once
+        if len(self.capabilities) == 0:
+            self._update_value = self._update_raw
+        elif self._cap_spec == ((1, 1, False),):
+            # Most common sensor shape, a single uint8 reading
+            self._only_cap = self.capabilities[0]
+            self._update_value = self._update_single_byte
+        elif len(self.capabilities) == 1:
+            # One compiled Struct for all the datasets of this capability (e.g. '<3H' for RGB)
+            n_datasets, byte_count, signed = self._cap_spec[0]
+            code = _STRUCT_CODES.get( (byte_count, signed) )
+            self._single_unpack = _get_struct(f'<{n_datasets}{code}').unpack_from if code else None
+            self._update_value = self._update_single
+        else:
+            self._update_value = self._update_combined
+            # Plans for each mode bit mask, built the first time that mask is seen
+            self._combo_plans = {}
+            self._combo_modes_mask = (1 << len(self._parse_plan)) - 1
 
-    def _get_validated_capabilities(self, caps):
+    @classmethod
+    def _get_validated_capabilities(cls, caps):
         """Convert capabilities in different formats (string, tuple, etc)
 
            Returns:
@@ -100,29 +171,81 @@ class Peripheral(Process):
                 validated_caps, thresholds  (list[`capability`], list[int]): list of capabilities and list of associated thresholds
         """
         validated_caps = []
-        thresholds = [1]*len(validated_caps)
+        thresholds = []
         for cap in caps:
             # Capability can be a tuple of (cap, threshold)
             if isinstance(cap, tuple):
                 cap, threshold = cap
-                thresholds.append(threshold)
             else:
-                thresholds.append(self._DEFAULT_THRESHOLD)
+                threshold = cls._DEFAULT_THRESHOLD
 
-            if isinstance(cap, self.capability):
+            if isinstance(cap, cls.capability):
                 # Make sure it's the write type of enumerated capability
-                validated_caps.append(cap)
-            elif type(cap) is str:
+                enum_cap = cap
+            elif isinstance(cap, str):
                 # Make sure we can convert this string capability into a defined enum
-                enum_cap = self.capability[cap]
-                validated_caps.append(enum_cap)
+                enum_cap = cls.capability[cap]
+            else:
+                continue
+            # Only keep the threshold if its capability was valid, so the two lists stay aligned
+            validated_caps.append(enum_cap)
+            thresholds.append(threshold)
         return validated_caps, thresholds
 
-    def _convert_bytes(self, msg_bytes:bytearray, byte_count):
+    def _build_parse_plan(self):
+        """Flatten the enabled capabilities into the order their datasets appear in sensor messages
+
+           This only depends on the capabilities, so it's done once up front instead of
+           looking up `datasets` on every incoming value.
+
+           Returns:
+                tuple of (capability, dataset index (None if the capability has a single dataset),
+                byte count, unpack function, mode bit, struct format character) for each dataset
+        """
+        plan = []
+        for cap, (n_datasets, byte_count, signed) in zip(self.capabilities, self._cap_spec):  # This is the order we program the sensor
+            unpack = _UNPACKERS.get( (byte_count, signed) )
+            if unpack is None:
+                # Let _convert_bytes report the unsupported width
+                unpack = lambda msg, offset, byte_count=byte_count: self._convert_bytes(msg, offset, byte_count)
+            code = _STRUCT_CODES.get( (byte_count, signed) )
+            for dataset in range(n_datasets):
+                mode_bit = 1 << len(plan)
+                plan.append( (cap, dataset if n_datasets > 1 else None, byte_count, unpack, mode_bit, code) )
+        return tuple(plan)
+
+    def _build_combo_plan(self, modes):
+        """Work out which datasets are present in a combined mode message with the bit mask *modes*
+
+           Only the set bits are visited, so the work is proportional to the number of datasets
+           actually present.  The plan also gets a single compiled `struct.Struct` that decodes all
+           of its datasets in one call.
+
+           Returns:
+                (unpack_from of the Struct for the whole message, or None if a dataset width has no
+                struct format, and the tuple of (capability, dataset index, byte count, unpack function)
+                present for that mask)
+        """
+        present = []
+        codes = []
+        while modes:
+            low_bit = modes & -modes
+            cap, dataset, byte_count, unpack, mode_bit, code = self._parse_plan[low_bit.bit_length()-1]
+            present.append( (cap, dataset, byte_count, unpack) )
+            codes.append(code)
+            modes ^= low_bit
+        if None in codes:
+            unpack_all = None
+        else:
+            unpack_all = _get_struct('<' + ''.join(codes)).unpack_from
+        return unpack_all, tuple(present)
+
+    def _convert_bytes(self, msg_bytes:bytearray, offset, byte_count):
         """Convert bytearry into a set of values based on byte_count per value
 
            Args:
                 msg_bytes (bytearray): Bytes to convert
+                offset (int): Position in `msg_bytes` where the value starts
                 byte_count (int): How many bytes per value to use when computer (can be 1, 2, or 4)
 
            Returns:
@@ -130,18 +253,13 @@ class Peripheral(Process):
                 If multiple values, then a list of those values
                 Value can be either uint8, uint16, or uint32 depending on value of `byte_count`
         """
-        if byte_count == 1:   # just a uint8
-            val = msg_bytes[0]
-        elif byte_count == 2: # uint16 little-endian
-            val = struct.unpack('<H', msg_bytes)[0]
-        elif byte_count == 4: # uint32 little-endian
-            val = struct.unpack('<I', msg_bytes)[0]
-        else:
+        unpack = _UNPACKERS.get( (byte_count, False) )  # uint8, or little-endian uint16/uint32
+        if unpack is None:
             self.message_error(f'Cannot convert array of {msg_bytes} length {len(msg_bytes)} to python datatype')
-            val = None
-        return val
+            return None
+        return unpack(msg_bytes, offset)
 
-    async def _parse_combined_sensor_values(self, msg: bytearray):
+    def _parse_combined_sensor_values(self, msg: bytearray):
         """
             Byte sequence is as follows:
                 # uint16 where each set bit indicates data value from that mode is present 
@@ -151,7 +269,7 @@ class Peripheral(Process):
                   a byte-width per dataset (RGB dataset is each a uint8)
 
             Args:
-                msg (bytearray) : the sensor message
+                msg (bytes) : the sensor message (only read, never modified)
 
             Returns:
                 None
@@ -160,33 +278,43 @@ class Peripheral(Process):
                 self.value
           
         """
-        msg.pop(0)  # Remove the leading 0 (since we never have more than 7 datasets even with all the combo modes activated
+        # Skip the leading 0 (since we never have more than 7 datasets even with all the combo modes activated
         # The next byte is a bit mask of the mode/dataset entries present in this value
-        modes = msg.pop(0)
-        dataset_i = 0
-        for cap in self.capabilities:  # This is the order we prgogramed the sensor
-            n_datasets, byte_count = self.datasets[cap][0:2]
-            for dataset in range(n_datasets):
-                if modes & (1<<dataset_i):  # Check if i'th bit of mode is set
-                    # Data corresponding to this dataset is present!
-                    # Now, pop off however many bytes are associated with this
-                    # dataset
-                    data = msg[0:byte_count]
-                    msg = msg[byte_count:]
-                    val = self._convert_bytes(data, byte_count)
-                    if n_datasets == 1:
-                        self.value[cap] = val
-                    else:
-                        self.value[cap][dataset] = val
-                dataset_i += 1
-
-
-
-    async def send_message(self, msg, msg_bytes):
-        """ Send outgoing message to BLEventQ """
-        while not self.message_handler:
-            await sleep(1)
-        await self.message_handler(msg, msg_bytes, peripheral=self)
+        # Bits for datasets we never enabled are ignored
+        modes = msg[1] & self._combo_modes_mask
+        plan = self._combo_plans.get(modes)
+        if plan is None:
+            plan = self._combo_plans[modes] = self._build_combo_plan(modes)
+        unpack_all, present = plan
+        if unpack_all:
+            # Decode every dataset in the message at once
+            values = unpack_all(msg, 2)
+        else:
+            values = []
+            cursor = 2
+            for cap, dataset, byte_count, unpack in present:
+                # Read however many bytes are associated with this
+                # dataset and move past them
+                values.append(unpack(msg, cursor))
+                cursor += byte_count
+        for (cap, dataset, byte_count, unpack), val in zip(present, values):
+            if dataset is None:
+                self.value[cap] = val
+            else:
+                self.value[cap][dataset] = val
+
+
+
+    async def set_message_handler(self, handler):
+        """ Called by the Hub on attach to connect this peripheral to the outgoing message queue """
+        self.message_handler = handler
+        await self._message_handler_ready.set()
+
+    async def send_message(self, msg, msg_bytes, response=True):
+        """ Send outgoing message to BLEventQ (*response* False skips waiting for the BLE write response) """
+        if not self.message_handler:
+            await self._message_handler_ready.wait()
+        await self.message_handler(msg, msg_bytes, peripheral=self, response=response)
 
     def _convert_speed_to_val(self, speed):
         """Map speed of -100 to 100 to a byte range
@@ -195,37 +323,45 @@ class Peripheral(Process):
             * 0 is floating
             * 127 is brake
 
+            Speeds outside -100 to 100 (other than 127) are clamped to that range.
+
             Returns:
                 byte
         """
         if speed == 127: return 127
-        if speed > 100: speed = 100
-        if speed < 0: 
-            # Now, truncate to 8-bits
-            speed = speed & 255 # Or I guess I could do 256-abs(s)
-        return speed
+        # Clamp to -100..100 and truncate to 8-bits (negative speeds become 256-abs(s))
+        return max(-100, min(100, speed)) & 255
 
 
-    async def set_output(self, mode, value):
+    async def set_output(self, mode, value, feedback=True):
         """Don't change this unless you're changing the way you do a Port Output command
-        
+
            Outputs the following sequence to the sensor
             * 0x00 = hub id from common header
             * 0x81 = Port Output Command
             * port
-            * 0x11 = Upper nibble (0=buffer, 1=immediate execution), Lower nibble (0=No ack, 1=command feedback)
+            * 0x01 = Upper nibble (0=buffer, 1=immediate execution), Lower nibble (0=No ack, 1=command feedback)
             * 0x51 = WriteDirectModeData
             * mode
             * value(s)
+
+           Args:
+              feedback (bool) : Set to False for fire-and-forget commands (like the
+                intermediate steps of a speed ramp) so the hub does not send back
+                a Port Output Feedback message for each one, and the BLE write
+                doesn't wait for a response either
         """
-        b = [0x00, 0x81, self.port, 0x01, 0x51, mode, value ]
-        await self.send_message(f'set output port:{self.port} mode: {mode} = {value}', b)
+        start_info = 0x01 if feedback else 0x00
+        b = self._PORT_OUTPUT.pack(0x00, 0x81, self.port, start_info, 0x51, mode, value)
+        await self.send_message(f'set output port:{self.port} mode: {mode} = {value}', b, response=feedback)
 
     # Use these for sensor readings
     async def update_value(self, msg_bytes):
         """ Message from message_dispatch will trigger Hub to call this to update a value from a sensor incoming message
             Depending on the number of capabilities enabled, we end up with different processing:
 
+            `msg_bytes` can be any read-only bytes-like object; it is parsed in place without being copied.
+
             If zero, then just set the `self.value` field to the raw message.
 
             If one, then:
@@ -236,22 +372,44 @@ class Peripheral(Process):
                 * Parse multiple sensor messages (could be any combination of the enabled modes)
                 * Set each dict entry to `self.value` to either a list of multiple values or a single value
 
+            Subclasses that need to post-process the decoded values override the
+            synchronous :func:`_post_decode` hook rather than this coroutine.
+
         """
-        msg = bytearray(msg_bytes)
-        if len(self.capabilities)==0:
-            self.value = msg
-        if len(self.capabilities)==1:
-            capability = self.capabilities[0]
-            datasets, bytes_per_dataset = self.datasets[capability][0:2]
-            for i in range(datasets):
-                msg_ptr = i*bytes_per_dataset
-                val = self._convert_bytes(msg[msg_ptr: msg_ptr+bytes_per_dataset], bytes_per_dataset)
-                if datasets==1:
-                    self.value[capability] = val
-                else:
-                    self.value[capability][i] = val
-        if len(self.capabilities) > 1:
-            await self._parse_combined_sensor_values(msg)
+        self._update_value(msg_bytes)
+        self._post_decode()
+
+    def _post_decode(self):
+        """Hook called after every decoded update to adjust `self.value` in place (no-op by default)"""
+
+    def _update_raw(self, msg_bytes):
+        """No capabilities, so just keep a reference to the raw message"""
+        self.value = msg_bytes
+
+    def _update_single_byte(self, msg_bytes):
+        """Fast path for a single capability with a single uint8 dataset"""
+        self.value[self._only_cap] = msg_bytes[0]
+
+    def _update_single(self, msg_bytes):
+        """Parse the datasets of the single enabled capability"""
+        # Values are read in place, so the incoming message is never copied
+        if self._single_unpack:
+            values = self._single_unpack(msg_bytes, 0)
+        else:
+            values = []
+            cursor = 0
+            for cap, dataset, byte_count, unpack, mode_bit, code in self._parse_plan:
+                values.append(unpack(msg_bytes, cursor))
+                cursor += byte_count
+        for (cap, dataset, *_), val in zip(self._parse_plan, values):
+            if dataset is None:
+                self.value[cap] = val
+            else:
+                self.value[cap][dataset] = val
+
+    def _update_combined(self, msg_bytes):
+        """Parse a combined mode message"""
+        self._parse_combined_sensor_values(msg_bytes)
 
     async def activate_updates(self):
         """ Send a message to the sensor to activate updates
@@ -274,36 +432,31 @@ class Peripheral(Process):
             return
 
         self.value = {}
-        for cap in self.capabilities:
-            self.value[cap] = [None]*self.datasets[cap][0]
+        for cap, (n_datasets, byte_count, signed) in zip(self.capabilities, self._cap_spec):
+            self.value[cap] = [None]*n_datasets
 
         if len(self.capabilities)==1:  # Just a normal single sensor
             mode = self.capabilities[0].value
-            b = [0x00, 0x41, self.port, mode, self.thresholds[0], 0, 0, 0, 1]
+            b = self._PORT_INPUT_FORMAT_SETUP.pack(0x00, 0x41, self.port, mode, self.thresholds[0], 1)
             await self.send_message(f'Activate SENSOR: port {self.port}', b) 
         else:
             # Combo mode.  Need to make sure only allowed combinations are preset
             # Lock sensor
-            b = [0x00, 0x42, self.port, 0x02]
+            b = bytes((0x00, 0x42, self.port, 0x02))
             await self.send_message(f'Lock port {self.port}', b)
 
             for cap, threshold in zip(self.capabilities, self.thresholds):
                 assert cap in self.allowed_combo, f'{cap} is not allowed to be sensed in combination with others'
                 # Enable each capability
-                b = [0x00, 0x41, self.port, cap.value, threshold, 0, 0, 0, 1]
+                b = self._PORT_INPUT_FORMAT_SETUP.pack(0x00, 0x41, self.port, cap.value, threshold, 1)
                 await self.send_message(f'enable mode {cap.value} on {self.port}', b)
 
             # Now, set the combination mode/dataset report order
-            b = [0x00, 0x42, self.port, 0x01, 0x00]
-            for cap in self.capabilities:
-                # RGB requires 3 datasets
-                datasets, byte_width = self.datasets[cap][0:2]
-                for i in range(datasets):
-                    b.append(16*cap.value+i)  # Mode is higher order nibble, dataset is lower order nibble
+            b = bytes((0x00, 0x42, self.port, 0x01, 0x00)) + self._combo_order
             await self.send_message(f'Set combo port {self.port}', b)
 
             # Unlock and start
-            b = [0x00, 0x42, self.port, 0x03]
+            b = bytes((0x00, 0x42, self.port, 0x03))
             await self.send_message(f'Activate SENSOR multi-update {self.port}', b)
 
 
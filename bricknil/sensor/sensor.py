@@ -173,16 +173,20 @@ class InternalTiltSensor(Peripheral):
                             'down':5,
                         })
 
+    _CAP_SO = capability.sense_orientation
+    _MASK_SO = 1 << capability.sense_orientation.value
 
-    async def update_value(self, msg_bytes):
+    def _post_decode(self):
         """If sense_orientation, then substitute the `IntenalTiltSensor.orientation`
            enumeration value into the self.value dict.  Otherwise, don't do anything
            special to the self.value dict.
         """
-        await super().update_value(msg_bytes)
-        so = self.capability.sense_orientation
-        if so in self.value:
-            self.value[so] = self.orientation(self.value[so])
+        if self._cap_mask & self._MASK_SO:
+            so = self._CAP_SO
+            val = self.value[so]
+            # In combo mode, orientation may not have been reported yet, or was already converted
+            if isinstance(val, int):
+                self.value[so] = self.orientation(val)
 
 
 
@@ -240,7 +244,7 @@ class ExternalTiltSensor(Peripheral):
                        ('sense_impact', 2),
                        ])
 
-    datasets = { capability.sense_angle: (2, 1),  
+    datasets = { capability.sense_angle: Peripheral.Dataset(n=2, w=1, min=-128, max=127, signed=True),
                  capability.sense_orientation: (1, 1),
                  capability.sense_impact: (3, 1),
                 }
@@ -254,24 +258,17 @@ class ExternalTiltSensor(Peripheral):
                             'near_side':9,
                         })
 
+    _CAP_SO = capability.sense_orientation
+    _MASK_SO = 1 << capability.sense_orientation.value
 
-    async def update_value(self, msg_bytes):
-        """If angle, convert the bytes being returned to twos complement ints
-           If orientation, then convert to the `orientation` enumeration.
+    def _post_decode(self):
+        """If orientation, then convert to the `orientation` enumeration.
+           (Angles are declared signed in `datasets`, so they already come back as twos complement ints)
 
         """
-        await super().update_value(msg_bytes)
         # No combinations possible, so only one capability with len(self.capabilities[])==1
-        if self.capabilities[0] == self.capability.sense_angle:
-            sa = self.capability.sense_angle
-            sx, sy = self.value[sa]
-            if sx & 128:  # negative sign bit
-                sx = -(256-sx)
-            if sy & 128:
-                sy = -(256-sy)
-            self.value[sa] = [sx, sy]
-        elif self.capabilities[0] == self.capability.sense_orientation:
-            so = self.capability.sense_orientation
+        if self._cap_mask & self._MASK_SO:
+            so = self._CAP_SO
             self.value[so] = self.orientation(self.value[so])
 
 
@@ -301,6 +298,11 @@ class RemoteButtons(Peripheral):
                 is_minus_pressed = self.left_buttons.minus_pressed()
                 is_red_pressed = self.left_buttons.red_pressed()
 
+                # Or read all three at once as bits (see `pressed_mask`)
+                pressed = self.left_buttons.pressed_mask()
+                if pressed & (self.left_buttons.MASK_PLUS | self.left_buttons.MASK_MINUS):
+                    self.message_info('plus or minus pressed')
+
     """
 
     _sensor_id = 0x0037
@@ -313,7 +315,12 @@ class RemoteButtons(Peripheral):
     datasets = { capability.sense_press: (3,1) }
     allowed_combo = []
 
-    def __init__(self, name, port=None, capabilities=[]):
+    _CAP_PRESS = capability.sense_press
+    _BTN_PLUS, _BTN_RED, _BTN_MINUS = Button.PLUS.value, Button.RED.value, Button.MINUS.value
+    MASK_PLUS, MASK_RED, MASK_MINUS = 1 << _BTN_PLUS, 1 << _BTN_RED, 1 << _BTN_MINUS
+    """Bits set in the `pressed_mask` return value for each button"""
+
+    def __init__(self, name, port=None, capabilities=None):
         """Maps the port names `L`, `R`"""
         if port:
             port = port.value
@@ -321,16 +328,22 @@ class RemoteButtons(Peripheral):
 
     def plus_pressed(self):
         """Return whether `value` reflects that the PLUS button is pressed"""
-        button_list = self.value[self.capability.sense_press]
-        return button_list[self.Button.PLUS] == 1
+        return self.value[self._CAP_PRESS][self._BTN_PLUS] == 1
     def minus_pressed(self):
         """Return whether `value` reflects that the MINUS button is pressed"""
-        button_list = self.value[self.capability.sense_press]
-        return button_list[self.Button.MINUS] == 1
+        return self.value[self._CAP_PRESS][self._BTN_MINUS] == 1
     def red_pressed(self):
         """Return whether `value` reflects that the RED button is pressed"""
-        button_list = self.value[self.capability.sense_press]
-        return button_list[self.Button.RED] == 1
+        return self.value[self._CAP_PRESS][self._BTN_RED] == 1
+    def pressed_mask(self):
+        """Return the state of all three buttons as one int
+
+           Bit 0 is PLUS, bit 1 is RED, and bit 2 is MINUS (the `Button` index),
+           so several buttons can be checked with a single `&` against
+           `MASK_PLUS`, `MASK_RED` and `MASK_MINUS`.
+        """
+        plus, red, minus = self.value[self._CAP_PRESS]
+        return (plus == 1) | ((red == 1) << 1) | ((minus == 1) << 2)
 
 class Button(Peripheral):
     """ Register to be notified of button presses on the Hub (Boost or PoweredUp)
@@ -362,17 +375,17 @@ class Button(Peripheral):
                }
     allowed_combo = [capability.sense_press]
 
-    def __init__(self, name, port=None, capabilities=[]):
+    def __init__(self, name, port=None, capabilities=None):
         """Call super-class with port set to 255 """
         super().__init__(name, 255, capabilities)
 
     async def activate_updates(self):
         """Use a special Hub Properties button message updates activation message"""
         self.value = {}
-        for cap in self.capabilities:
-            self.value[cap] = [None]*self.datasets[cap][0]
+        for cap, (n_datasets, byte_count, signed) in zip(self.capabilities, self._cap_spec):
+            self.value[cap] = [None]*n_datasets
 
-        b = [0x00, 0x01, 0x02, 0x02]  # Button reports from "Hub Properties Message Type"
+        b = bytes((0x00, 0x01, 0x02, 0x02))  # Button reports from "Hub Properties Message Type"
         await self.send_message(f'Activate button reports: port {self.port}', b) 
 
 
@@ -516,24 +529,10 @@ class DuploSpeedSensor(Peripheral):
                        ('sense_count', 1),
                        ])
 
-    datasets = { capability.sense_speed: Peripheral.Dataset(n=1, w=2, min=-300, max=300),
-                 capability.sense_count: Peripheral.Dataset(n=1, w=4, min=-(1<<31), max=(1<<31-1)),
+    datasets = { capability.sense_speed: Peripheral.Dataset(n=1, w=2, min=-300, max=300, signed=True),
+                 capability.sense_count: Peripheral.Dataset(n=1, w=4, min=-(1<<31), max=(1<<31)-1, signed=True),
                 }
 
     allowed_combo = [ capability.sense_speed,
                       capability.sense_count,
                     ]
-
-    async def update_value(self, msg_bytes):
-        """Hack to negate reverse speeds.  This should really be specified elsewehre
-        """
-        await super().update_value(msg_bytes)
-        ss = self.capability.sense_speed
-        sc = self.capability.sense_count
-        if ss in self.value:
-            if self.value[ss] & (1<<15):  # negative sign bit
-                self.value[ss] = -((1<<16) - self.value[ss])
-        if sc in self.value:
-            if self.value[sc] & (1<<31):  # negative sign bit
-                self.value[sc] = -((1<<32) - self.value[sc])
-
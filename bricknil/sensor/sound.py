@@ -51,7 +51,7 @@ class DuploSpeaker(Peripheral):
            is called automatically after this sensor is attached.
         """
         mode = 1
-        b = [0x00, 0x41, self.port, mode, 0x01, 0x00, 0x00, 0x00, 0x01]
+        b = self._PORT_INPUT_FORMAT_SETUP.pack(0x00, 0x41, self.port, mode, 1, 1)
         await self.send_message('Activate DUPLO Speaker: port {self.port}', b)
 
     async def play_sound(self, sound):
@@ -16,9 +16,32 @@
 
 import logging
 import json
-from curio import run, spawn,  sleep, Queue, tcp_server
+from socket import IPPROTO_TCP, TCP_NODELAY
+from curio import run, spawn,  sleep, Queue, tcp_server, TaskTimeout, timeout_after
+
+try:
+    # Optional, much faster JSON encoder that goes straight to bytes
+    import orjson
+    def _json_bytes(obj):
+        return orjson.dumps(obj)
+except ImportError:
+    _dumps = json.dumps
+    _SEPARATORS = (',', ':')  # No padding whitespace, same compact output as orjson
+    def _json_bytes(obj):
+        return _dumps(obj, separators=_SEPARATORS, ensure_ascii=False).encode('utf-8')
 
 logger = logging.getLogger(str(__name__))
+
+WEB_QUEUE_SIZE = 256
+"""Most messages held for web clients before the oldest ones are dropped"""
+
+WEB_SEND_TIMEOUT = 5
+"""Seconds a web client gets to take a write before it is disconnected"""
+
+WEB_BATCH_DELAY = 1/30
+"""Seconds a web client waits after the first message before writing, so bursts of
+sensor updates go out in at most ~30 writes per second"""
+
 #async def socket_server(web_out_queue, address):
     #sock = socket(AF_INET, SOCK_STREAM)
     #sock.setsockopt(SOL_SOCKET, SO_REUSEADDR,1)
@@ -37,54 +60,175 @@ async def bricknil_socket_server(web_out_queue, address): #pragma: no cover
        This fuction is spawned as a task during system instantiation
        in :func:`bricknil.bricknil._run_all``
     """
+    clients = WebClients()
+
     async def web_client_connected(client, addr):
-        logger.info('connection from', addr)
-        wc = WebClient(client, addr, web_out_queue)
-        await wc.run()
+        logger.info('connection from %s', addr)
+        wc = WebClient(client, addr, batch_delay=WEB_BATCH_DELAY)
+        clients.add(wc)
+        try:
+            await wc.run()
+        finally:
+            clients.discard(wc)
 
     task = await spawn(tcp_server, '', 25000, web_client_connected, daemon=True)
+    task_broadcast = await spawn(web_broadcast, web_out_queue, clients, daemon=True)
+
+async def web_broadcast(in_queue, clients): #pragma: no cover
+    """Copy every message from the global BrickNil `curio.Queue` to each connected client
 
+        Peripherals insert the messages into the queue.  Each client has its own
+        bounded queue and writer (:func:`WebClient.run`), so handing a message over
+        never blocks, and a slow client only ever loses its own oldest messages.
+
+        Args:
+            in_queue (`curio.Queue`) : (key, message bytes) pairs from :class:`WebMessage`
+            clients (`WebClients`) : Connected :class:`WebClient` instances
+    """
+    while True:
+        key, msg = await in_queue.get()
+        await in_queue.task_done()
+        for wc in clients.snapshot:
+            await wc.put(key, msg)
+
+
+class WebClients: #pragma: no cover
+    """The connected :class:`WebClient` instances
+
+       Clients connect and disconnect far less often than messages get broadcast,
+       so the tuple that :func:`web_broadcast` iterates is rebuilt on each change
+       instead of the set being copied for every message.  A client that goes away
+       while a message is being handed out stays in that broadcast's tuple, which is
+       harmless (its queue just isn't read any more).
+    """
+    def __init__(self):
+        self._clients = set()
+        self.snapshot = ()
 
-class WebClient: #pragma: no cover
+    def add(self, wc):
+        self._clients.add(wc)
+        self.snapshot = tuple(self._clients)
+
+    def discard(self, wc):
+        self._clients.discard(wc)
+        self.snapshot = tuple(self._clients)
+
+
+class WebClient:
     """ Represents a client that has connected to BrickNil's server
 
-        Each client has a connection to the global BrickNil `curio.Queue`
-        that handles broadcast messages about peripherals.  Peripherals
-        insert the messages into the queue, and clients can read from 
-        it (hence why it's called in_queue in this class).
+        Messages from :func:`web_broadcast` wait in this client's own queue
+        until :func:`run` writes them out.  Any messages that are already
+        waiting in the queue get sent together in a single `sendall`.
+
+        Capability values are only queued when they differ from the last one
+        this client has (or is about to get) for that capability, since idle
+        sensors keep re-reporting the same reading.
+
+        Args:
+            batch_delay (float) : Optional number of seconds to wait after the first
+                message so more messages can be coalesced into the same write
     """
-    def __init__(self, client, addr, in_queue):
-        assert in_queue is not None
-        self.in_queue = in_queue
+    def __init__(self, client, addr, batch_delay=0):
         self.client = client
         self.addr = addr
-        logger.info(f'Web client {client} connected from {addr}')
+        self.batch_delay = batch_delay
+        self.out_queue = Queue(maxsize=WEB_QUEUE_SIZE)
+        self._latest = {}  # value key -> newest message queued for it that hasn't been dropped
+        # Writes are already batched, so don't let Nagle hold back the small ones
+        client.setsockopt(IPPROTO_TCP, TCP_NODELAY, 1)
+        logger.info('Web client %s connected from %s', client, addr)
         
+    async def put(self, key, msg):
+        """Queue a message for this client, dropping its oldest one if the queue is full
+
+           Args:
+                key : Identifies the capability a value message is for (None for other messages)
+                msg (bytes) : The message
+        """
+        if key is not None and self._latest.get(key) == msg:
+            return  # Already on its way to this client
+        if self.out_queue.full():
+            # get() won't block on a full queue
+            old_key, old_msg = await self.out_queue.get()
+            await self.out_queue.task_done()
+            if old_key is not None and self._latest.get(old_key) is old_msg:
+                # This client will never see that value now, so it mustn't hold back a resend
+                del self._latest[old_key]
+        await self.out_queue.put( (key, msg) )
+        if key is not None:
+            self._latest[key] = msg
 
-    async def run(self):
+    async def run(self): #pragma: no cover
 
         async with self.client:
             while True:
-                msg = await self.in_queue.get()
-                #print(f'Webclient queue got: {msg}')
-                await self.in_queue.task_done()
-                await self.client.sendall(msg)
+                msgs = [await self.out_queue.get()]
+                await self.out_queue.task_done()
+                if self.batch_delay:
+                    await sleep(self.batch_delay)
+                # Drain whatever else is ready (get() won't block on a non-empty queue)
+                while not self.out_queue.empty():
+                    msgs.append(await self.out_queue.get())
+                    await self.out_queue.task_done()
+                try:
+                    async with timeout_after(WEB_SEND_TIMEOUT):
+                        await self.client.sendall(b''.join(msg for key, msg in msgs))
+                except (TaskTimeout, OSError) as e:
+                    logger.info('Dropping web client %s: %r', self.addr, e)
+                    break
         logger.info('connection closed')
 
 class WebMessage:
     """Handles message conversion into JSON and transmission
+
+       Delivery is best-effort: if the outgoing queue is full (no client connected,
+       or clients not keeping up), the oldest messages are dropped so the newest
+       state always gets through.
     """
 
     def __init__(self, hub):
         self.hub = hub
+        self._prefix = {}  # peripheral name -> (port, serialized envelope up to 'message')
     
-    async def send(self, peripheral, msg):
-        obj = { 'hub': self.hub.name,
-                'peripheral_type': peripheral.__class__.__name__,
-                'peripheral_name': peripheral.name,
-                'peripheral_port': peripheral.port,
-                'message': msg ,
-        }
-        obj_string = json.dumps(obj)
-        logger.debug(obj_string)
-        await self.hub.web_queue_out.put(f'{obj_string}\n'.encode('utf-8'))
\ No newline at end of file
+    def _get_prefix(self, peripheral):
+        """Return the serialized constant part of the JSON object for this peripheral
+
+           Everything except the message is fixed for a peripheral once its port is
+           known, so only the message needs to be encoded on each send.
+        """
+        port, prefix = self._prefix.get(peripheral.name, (None, None))
+        if prefix is None or port != peripheral.port:
+            envelope = _json_bytes({ 'hub': self.hub.name,
+                                     'peripheral_type': peripheral.__class__.__name__,
+                                     'peripheral_name': peripheral.name,
+                                     'peripheral_port': peripheral.port,
+                                   })
+            # Reopen the object so the message can be appended as the last key
+            prefix = envelope[:-1] + b',"message":'
+            self._prefix[peripheral.name] = (peripheral.port, prefix)
+        return prefix
+
+    async def send(self, peripheral, msg, key=None):
+        """Queue *msg* from *peripheral* for the web clients
+
+           Args:
+                key : Passed along to :func:`WebClient.put`, which skips repeated values with the same key
+        """
+        obj_bytes = self._get_prefix(peripheral) + _json_bytes(msg) + b'}'
+        logger.debug('%s', obj_bytes)
+        queue = self.hub.web_queue_out
+        while queue.full():
+            # Drop the oldest message (get() won't block on a full queue)
+            await queue.get()
+            await queue.task_done()
+        await queue.put( (key, obj_bytes + b'\n') )
+
+    async def send_value(self, peripheral, cap, value):
+        """Send the value of one capability
+
+           Each client skips values it already has (see :class:`WebClient`), so
+           this is keyed by hub, peripheral and capability.
+        """
+        await self.send(peripheral, f'value change mode: {cap.value} = {value}',
+                        key=(self.hub.name, peripheral.name, cap))
@@ -26,6 +26,9 @@ class Robot(BoostHub):
 
         # The powered on position becomes the 12 o'clock reference point
 
+        # Draw the random rotations up front, so nothing extra runs between motor commands
+        rotations = [randint(1,180) for i in range(5)]
+
         for i in range(5):
             # Turn to 11 o'clock position
             await self.led.set_color(Color.blue)
@@ -42,7 +45,7 @@ class Robot(BoostHub):
 
             # Rotate a random amount of degrees from 1 to 180
             await self.led.set_color(Color.purple)
-            await self.motor.rotate(randint(1,180), speed=10)
+            await self.motor.rotate(rotations[i], speed=10)
             await sleep(3)
 
             # Then reset to 12 o'clock position
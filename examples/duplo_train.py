@@ -7,6 +7,8 @@ from bricknil.sensor import DuploTrainMotor, DuploSpeedSensor, LED, DuploVisionS
 from bricknil.const import Color
 import logging
 
+COLORS = (Color.red, Color.purple, Color.yellow, Color.blue, Color.white)
+
 #@attach(DuploSpeaker, name='speaker')
 @attach(DuploVisionSensor, name='vision_sensor', capabilities=[('sense_reflectivity', 5)])
 @attach(LED, name='led')
@@ -28,8 +30,8 @@ class Train(DuploTrainHub):
             self.message_info('Movement detected: starting...')
         elif self.go:
             #count = self.speed_sensor.value[DuploSpeedSensor.capability.sense_count]
-            #self.message_info(f'Speed sensor changed speed: {speed} count: {count}')
-            self.message_info(f'Speed sensor changed speed: {speed}')
+            #self.message_info('Speed sensor changed speed: %s count: %s', speed, count)
+            self.message_info('Speed sensor changed speed: %s', speed)
 
     async def vision_sensor_change(self):
         cap = DuploVisionSensor.capability
@@ -37,28 +39,27 @@ class Train(DuploTrainHub):
         #ctag  = self.vision_sensor.value[cap.sense_ctag]
         reflt  = self.vision_sensor.value[cap.sense_reflectivity]
         if self.go:
-            #self.message_info(f'Vision sensor changed color: {color} ctag: {ctag} reflt: {reflt}')
-            self.message_info(f'Vision sensor changed color: reflt: {reflt}')
+            #self.message_info('Vision sensor changed color: %s ctag: %s reflt: %s', color, ctag, reflt)
+            self.message_info('Vision sensor changed color: reflt: %s', reflt)
 
     async def run(self):
         self.message_info("Running")
 
-        colors = cycle([Color.red, Color.purple, Color.yellow, Color.blue, Color.white])
-
         snd = DuploSpeaker.sounds
-        sounds = cycle([snd.brake, snd.station, snd.water, snd.horn, snd.steam])
+        sounds = (snd.brake, snd.station, snd.water, snd.horn, snd.steam)
 
         self.message_info('Please move the train to start the program')
+        colors = cycle(COLORS)
         while not self.go:
             await self.led.set_color(next(colors))
             await sleep(0.3)
 
         for i in range(5):
-            await self.led.set_color(next(colors))       # Cycle through the colors
-            #await self.speaker.play_sound(next(sounds))  # cycle through the sounds
+            await self.led.set_color(COLORS[i % len(COLORS)])        # Cycle through the colors
+            #await self.speaker.play_sound(sounds[i % len(sounds)])  # cycle through the sounds
             tgt_speed = 20 + i*15                        # Keep increasing the speed
             await self.motor.ramp_speed(tgt_speed, 2000)
-            self.message_info(f"Set speed to {i}")
+            self.message_info('Set speed to %s', i)
             await sleep(3)
 
         self.message_info("Done")
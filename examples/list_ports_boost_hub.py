@@ -1,5 +1,4 @@
 import logging
-from itertools import cycle
 from curio import sleep
 from bricknil import attach, start
 from bricknil.hub import BoostHub
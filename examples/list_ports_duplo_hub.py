@@ -1,4 +1,3 @@
-from itertools import cycle
 from curio import sleep
 from bricknil import attach, start
 from bricknil.hub import DuploTrainHub
@@ -1,5 +1,4 @@
 import logging
-from itertools import cycle
 from curio import sleep
 from bricknil import attach, start
 from bricknil.hub import PoweredUpRemote
@@ -13,11 +12,11 @@ from bricknil.const import Color
 class Remote(PoweredUpRemote):
 
     async def hub_btn_change(self):
-        self.message_info(f'Hub Btn change {self.hub_btn.value}')
+        self.message_info('Hub Btn change %s', self.hub_btn.value)
     async def btn_r_change(self):
-        self.message_info(f'Btn r change {self.btn_r.value}')
+        self.message_info('Btn r change %s', self.btn_r.value)
     async def btn_l_change(self):
-        self.message_info(f'Btn l change {self.btn_l.value}')
+        self.message_info('Btn l change %s', self.btn_l.value)
 
     async def run(self):
         self.message_info("Running")
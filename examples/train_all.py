@@ -1,6 +1,7 @@
 import logging
+from operator import itemgetter
 from itertools import cycle
-from curio import sleep
+from curio import sleep, Event, TaskGroup
 from bricknil import attach, start
 from bricknil.hub import PoweredUpHub
 from bricknil.sensor import TrainMotor, VisionSensor, Button, LED
@@ -13,18 +14,24 @@ from bricknil.const import Color
 @attach(TrainMotor, name='motor')
 class Train(PoweredUpHub):
 
+    # Fetch both readings in one call
+    _distance_count = itemgetter(VisionSensor.capability.sense_distance, VisionSensor.capability.sense_count)
+
+    def __init__(self, name):
+        self.go = Event()   # Set when the hub button is pushed
+        super().__init__(name)
+
     async def train_btn_change(self):
-        self.message_info(f'train button push {self.train_btn.value}')
+        self.message_info('train button push %s', self.train_btn.value)
         btn = self.train_btn.value[Button.capability.sense_press]
         if btn == 1:
             # Pushed!
-            self.go = True
+            await self.go.set()
 
 
     async def train_sensor_change(self):
-        self.message_info(f'Train sensor value change {self.train_sensor.value}')
-        distance = self.train_sensor.value[VisionSensor.capability.sense_distance]
-        count = self.train_sensor.value[VisionSensor.capability.sense_count]
+        self.message_info('Train sensor value change %s', self.train_sensor.value)
+        distance, count = self._distance_count(self.train_sensor.value)
 
         if count > 3:
             # Wave your hand more than three times in front of the sensor and the program ends
@@ -36,28 +43,33 @@ class Train(PoweredUpHub):
         # Flag a change
         self.sensor_change = True
 
+    async def _blink(self, colors):
+        """Cycle the LED through *colors* once a second until cancelled"""
+        for color in cycle(colors):
+            await self.train_led.set_color(color)
+            await sleep(1)
+
     async def run(self):
         self.message_info("Running")
         self.motor_speed = 0
         self.keep_running = True
         self.sensor_change = False
-        self.go = False
 
-        # Blink the color  from purple and yellow
-        colors = cycle([Color.purple, Color.yellow])
-        while not self.go:  # Wait until the hub button is pushed
-            await self.train_led.set_color(next(colors))
-            await sleep(1)
+        # Blink the color  from purple and yellow until the hub button is pushed
+        async with TaskGroup() as g:
+            await g.spawn(self._blink, (Color.purple, Color.yellow))
+            await self.go.wait()
+            await g.cancel_remaining()
 
-        colors = cycle([Color.green, Color.orange])
         # Ready to go, let's change the color to green!
         while self.keep_running:
             if self.sensor_change:
-                await self.train_led.set_color(next(colors))
+                # Green while changing speed, then orange until the next change
+                await self.train_led.set_color(Color.green)
                 await self.motor.ramp_speed(self.motor_speed, 900)  # Ramp to new speed in 0.9 seconds
                 self.sensor_change = False
                 await sleep(1)
-                await self.train_led.set_color(next(colors))
+                await self.train_led.set_color(Color.orange)
             else:
                 await sleep(1)
 
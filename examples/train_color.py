@@ -1,6 +1,7 @@
 import logging
+from operator import itemgetter
 from itertools import cycle
-from curio import sleep
+from curio import sleep, Event, TaskGroup
 from bricknil import attach, start
 from bricknil.hub import PoweredUpHub
 from bricknil.sensor import TrainMotor, VisionSensor, Button, LED
@@ -8,32 +9,38 @@ from bricknil.process import Process
 from bricknil.const import Color
 from random import randint
 
+COLORS = (Color.green, Color.orange)   # LED colors to alternate between while running
+
 @attach(Button, name='train_btn', capabilities=['sense_press'])
 @attach(LED, name='train_led')
 @attach(VisionSensor, name='train_sensor', capabilities=['sense_color', 'sense_reflectivity'])
 @attach(TrainMotor, name='motor')
 class Train(PoweredUpHub):
 
+    # Fetch both readings in one call
+    _refl_color = itemgetter(VisionSensor.capability.sense_reflectivity, VisionSensor.capability.sense_color)
+
     def __init__(self, name):
         self.go = False
+        self.started = Event()  # Set the first time the hub button is pushed
         super().__init__(name)
 
     async def train_btn_change(self):
-        self.message_info(f'train button push {self.train_btn.value}')
+        self.message_info('train button push %s', self.train_btn.value)
         btn = self.train_btn.value[Button.capability.sense_press]
         if btn == 1 and not self.go:
             # Pushed!
             self.go = True
+            await self.started.set()
         elif btn==1 and self.go:
             self.go = False
 
 
     async def train_sensor_change(self):
-        #self.message_info(f'Train sensor value change {self.train_sensor.value}')
-        refl = self.train_sensor.value[VisionSensor.capability.sense_reflectivity]
+        #self.message_info('Train sensor value change %s', self.train_sensor.value)
+        refl, color = self._refl_color(self.train_sensor.value)
         if refl >18:
             self.message_info('Switch!')
-        color = self.train_sensor.value[VisionSensor.capability.sense_color]
         c = Color(color)
         if c == Color.blue:
             self.message_info('Blue')
@@ -44,30 +51,36 @@ class Train(PoweredUpHub):
 
 
         #count = self.train_sensor.value[VisionSensor.capability.sense_count]
-        #self.message_info(f'Count {count}')
+        #self.message_info('Count %s', count)
+
 
+    async def _blink(self, colors):
+        """Cycle the LED through *colors* once a second until cancelled"""
+        for color in cycle(colors):
+            await self.train_led.set_color(color)
+            await sleep(1)
 
     async def run(self):
         self.message_info("Running")
         self.motor_speed = 0
-        self.go = False
         slow = 40
         fast = 70
 
-        # Blink the color  from purple and yellow
-        colors = cycle([Color.purple, Color.yellow])
-        while not self.go:  # Wait until the hub button is pushed
-            await self.train_led.set_color(next(colors))
-            await sleep(1)
+        # Blink the color  from purple and yellow until the hub button is pushed
+        async with TaskGroup() as g:
+            await g.spawn(self._blink, (Color.purple, Color.yellow))
+            await self.started.wait()
+            await g.cancel_remaining()
 
-        colors = cycle([Color.green, Color.orange])
         # Ready to go, let's change the color to green!
         await self.motor.ramp_speed(fast, 2000)
         self.slow = False
+        i = 0
         while self.go:
             #speed = randint(30,30)
             #await self.motor.ramp_speed(speed, 2000)
-            await self.train_led.set_color(next(colors))
+            await self.train_led.set_color(COLORS[i % len(COLORS)])
+            i += 1
             if self.slow:
                 await self.motor.ramp_speed(slow, 2000)
                 await self.train_led.set_color(Color.red)
@@ -1,5 +1,6 @@
 import logging
-from curio import sleep
+from operator import itemgetter
+from curio import Event, ignore_after
 from bricknil import attach, start
 from bricknil.hub import PoweredUpHub
 from bricknil.sensor import TrainMotor, VisionSensor
@@ -9,10 +10,16 @@ from bricknil.process import Process
 @attach(TrainMotor, name='motor')
 class Train(PoweredUpHub):
 
+    # Fetch both readings in one call
+    _distance_count = itemgetter(VisionSensor.capability.sense_distance, VisionSensor.capability.sense_count)
+
+    def __init__(self, name):
+        self.sensor_change = Event()    # Set whenever the sensor reports a new reading
+        super().__init__(name)
+
     async def train_sensor_change(self):
-        self.message_info(f'Train sensor value change {self.train_sensor.value}')
-        distance = self.train_sensor.value[VisionSensor.capability.sense_distance]
-        count = self.train_sensor.value[VisionSensor.capability.sense_count]
+        self.message_info('Train sensor value change %s', self.train_sensor.value)
+        distance, count = self._distance_count(self.train_sensor.value)
 
         if count > 3:
             # Wave your hand more than three times in front of the sensor and the program ends
@@ -22,19 +29,27 @@ class Train(PoweredUpHub):
         self.motor_speed = (10-distance)*10
 
         # Flag a change
-        self.sensor_change = True
+        await self.sensor_change.set()
+
+    async def _settle(self):
+        """Wait until there's been no new sensor reading for 0.1s"""
+        while self.sensor_change.is_set():
+            self.sensor_change.clear()
+            await ignore_after(0.1, self.sensor_change.wait)
 
     async def run(self):
         self.message_info("Running")
         self.motor_speed = 0
         self.keep_running = True
-        self.sensor_change = False
 
         while self.keep_running:
-            if self.sensor_change:
+            # Sleep until the sensor reports something
+            await self.sensor_change.wait()
+            # Then let the readings settle and only ramp to the last speed, but don't wait
+            # more than 0.5s so the train still reacts while the sensor keeps streaming
+            await ignore_after(0.5, self._settle)
+            if self.keep_running:
                 await self.motor.ramp_speed(self.motor_speed, 900)  # Ramp to new speed in 0.9 seconds
-                self.sensor_change = False
-            await sleep(1)
 
 async def system():
     train = Train('My Train')
@@ -1,5 +1,4 @@
 import logging
-from itertools import cycle
 from curio import sleep
 from bricknil import attach, start
 from bricknil.hub import PoweredUpHub
@@ -12,11 +11,11 @@ class Train(PoweredUpHub):
 
     async def voltage_change(self):
         mv = self.voltage.value
-        self.message_info(f'train voltage {mv}')
+        self.message_info('train voltage %s', mv)
 
     async def current_change(self):
         ma = self.current.value
-        self.message_info(f'train current {ma}')
+        self.message_info('train current %s', ma)
 
     async def run(self):
         self.message_info("Running")
@@ -24,14 +23,11 @@ class Train(PoweredUpHub):
         await self.motor.ramp_speed(50,3000)
         await sleep(60)
 
-        for i in range(10,100,10):
-            self.message_info(f'ramping speed {i}')
-            await self.motor.ramp_speed(i, 900)  # Ramp to new speed in 0.9 seconds
-            await sleep(3)
-        for i in range(100,10,-10):
-            self.message_info(f'ramping down speed {i}')
-            await self.motor.ramp_speed(i, 900)  # Ramp to new speed in 0.9 seconds
-            await sleep(3)
+        # Ramp up and back down in steps of 10, taking 0.9 seconds to reach each new speed
+        # and then holding it until 3 seconds have passed
+        self.message_info('ramping speed up and down')
+        speeds = list(range(10,100,10)) + list(range(100,10,-10))
+        await self.motor.play_schedule([(i, 900, 3000) for i in speeds])
 
 
 async def system():
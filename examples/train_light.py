@@ -1,5 +1,5 @@
 import logging
-from curio import sleep
+from curio import clock, wake_at
 from bricknil import attach, start
 from bricknil.hub import PoweredUpHub
 from bricknil.sensor import Light
@@ -11,19 +11,19 @@ class Train(PoweredUpHub):
     async def run(self):
         self.message_info("Running")
         self.keep_running = True
-        brightness = 0
-        delta = 10
+        step = 0
+        tick = await clock()
 
         while self.keep_running:
-            # change the brightness up and down between -100 and 100
-            brightness += delta
-            if brightness >= 100:
-                delta = -10
-            elif brightness <= -100:
-                delta = 10
-            self.message_info("Brightness: {}".format(brightness))
+            # change the brightness up and down between -100 and 100 in steps of 10
+            # (triangle wave: 10, 20, .. 100, 90, .. -100, -90, ..)
+            step += 1
+            brightness = abs(((step*10 + 300) % 400) - 200) - 100
+            self.message_info("Brightness: %s", brightness)
             await self.light.set_brightness(brightness)
-            await sleep(1)
+            # Step on a fixed one second schedule, however long the BLE write took
+            tick += 1
+            await wake_at(tick)
 
 
 async def system():
@@ -1,6 +1,6 @@
 import logging
 
-from curio import sleep, Queue
+from curio import Queue, Event
 from bricknil import attach, start
 from bricknil.hub import PoweredUpRemote, BoostHub
 from bricknil.sensor import InternalMotor, RemoteButtons, LED, Button
@@ -13,63 +13,72 @@ from bricknil.const import Color
 @attach(RemoteButtons, name='btns_left',  capabilities=['sense_press'])
 class Remote(PoweredUpRemote):
 
+    def __init__(self, name):
+        self.stop = Event()     # Set this to let the remote's run() finish
+        super().__init__(name)
+
+    async def _tell(self, msg):
+        """Send the latest command, replacing any the robot hasn't picked up yet"""
+        while self.tell_robot.full():
+            await self.tell_robot.get()
+            await self.tell_robot.task_done()
+        await self.tell_robot.put(msg)
+
     async def btns_left_change(self):
         if self.btns_left.plus_pressed():
-            await self.tell_robot.put('forward')
+            await self._tell('forward')
         elif self.btns_left.minus_pressed():
-            await self.tell_robot.put('backward')
+            await self._tell('backward')
         else:
-            await self.tell_robot.put('stop')
+            await self._tell('stop')
 
     async def btns_right_change(self):
         if self.btns_right.plus_pressed():
-            await self.tell_robot.put('right')
+            await self._tell('right')
         elif self.btns_right.minus_pressed():
-            await self.tell_robot.put('left')
+            await self._tell('left')
         else:
-            await self.tell_robot.put('stop')
+            await self._tell('stop')
 
     async def run(self):
         self.message('Running')
         # Set the remote LED to green to show we're ready
         await self.led.set_color(Color.green)
-        while True:
-            await sleep(10)   # Keep the remote running
+        await self.stop.wait()   # Keep the remote running, without waking up periodically
 
 @attach(LED, name='led') 
 @attach(InternalMotor, name='motor_right', port=InternalMotor.Port.B)
 @attach(InternalMotor, name='motor_left', port=InternalMotor.Port.A)
 class Robot(BoostHub):
 
+    # Direction of the (left, right) motors for each command from the remote
+    _CMDS = { 'forward':  ( 1,  1),
+              'backward': (-1, -1),
+              'left':     (-1,  1),
+              'right':    ( 1, -1),
+              'stop':     ( 0,  0),
+            }
+
     async def run(self):
         self.message("Running")
         speed = 30
 
         # Set the robot LED to green to show we're ready
         await self.led.set_color(Color.green)
+        last_msg = None
         while True:
             msg = await self.listen_remote.get()
             await self.listen_remote.task_done()
-            if msg=='forward':
-                self.message('going forward')
-                await self.motor_left.set_speed(speed)
-                await self.motor_right.set_speed(speed)
-            elif msg=='backward':
-                self.message('going backward')
-                await self.motor_left.set_speed(-speed)
-                await self.motor_right.set_speed(-speed)
-            elif msg=='stop':
-                self.message('stop')
-                await self.motor_left.set_speed(0)
-                await self.motor_right.set_speed(0)
-            elif msg=='left':
-                self.message('left')
-                await self.motor_left.set_speed(-speed)
-                await self.motor_right.set_speed(speed)
-            elif msg=='right':
-                self.message('right')
-                await self.motor_left.set_speed(speed)
-                await self.motor_right.set_speed(-speed)
+            if msg == last_msg:
+                continue    # Motors are already doing this
+            last_msg = msg
+            direction = self._CMDS.get(msg)
+            if direction is None:
+                continue
+            self.message(msg)
+            left, right = direction
+            await self.motor_left.set_speed(left*speed)
+            await self.motor_right.set_speed(right*speed)
 
 
 async def system():
@@ -77,7 +86,8 @@ async def system():
     remote = Remote('remote')
     
     # Define a message passing queue from the remote to the robot
-    remote.tell_robot = Queue()
+    # (only holds the newest command, so the robot never works through a stale backlog)
+    remote.tell_robot = Queue(maxsize=1)
     robot.listen_remote = remote.tell_robot
 
 if __name__ == '__main__':
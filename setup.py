@@ -56,7 +56,10 @@ long_description = read('README.rst')
 required = []
 dependency_links = []
 with open("requirements.txt") as f:
-    for line in f.read().splitlines():
+    for line in f:
+        line = line.rstrip()
+        if not line:
+            continue
         if line.startswith('git'):
             _, url = line.split('+')
             pkg_name = url[url.index('=')+1:]
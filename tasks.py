@@ -24,13 +24,15 @@ def docs(c):
     githubpages = "/Users/virantha/dev/githubdocs/bricknil"
     with c.cd(githubpages):
         c.run('git checkout gh-pages')
-        c.run('git pull origin gh-pages')
+        # Doesn't depend on the docs/ cleanup below, so let it run in the background
+        pull = c.run('git pull origin gh-pages', asynchronous=True)
     #c.run("head CHANGES.rst > CHANGES_RECENT.rst")
     #c.run("tail -n 1 CHANGES.rst >> CHANGES_RECENT.rst")
     with c.cd("docs"):
         print("Running sphinx in docs/ and building to ~/dev/githubdocs/bricknil")
         c.run("make clean")
         c.run('rm -rf _auto_summary')
+        pull.join()     # Need the up-to-date gh-pages checkout before building into it
         c.run("make html BUILDDIR=%s" % githubpages)
         #c.run("cp -R ../test/htmlcov %s/html/testing" % githubpages)
     with c.cd(githubpages):
@@ -0,0 +1,23 @@
+import os
+import pytest
+from curio import Kernel
+
+from hypothesis import settings
+from hypothesis.database import DirectoryBasedExampleDatabase
+
+# Pick with HYPOTHESIS_PROFILE=dev|ci (defaults to ci when the CI variable is set, dev otherwise)
+#  - ci:  derandomized, so every CI run tries the same examples
+#  - dev: random exploration with more examples, so local runs keep finding new cases
+# Both remember failures in .hypothesis/examples, so they get replayed first on the
+# next run instead of being found and shrunk again
+_EXAMPLES = DirectoryBasedExampleDatabase('.hypothesis/examples')
+settings.register_profile('ci', database=_EXAMPLES, derandomize=True, deadline=None, max_examples=50)
+settings.register_profile('dev', database=_EXAMPLES, deadline=None, max_examples=200)
+settings.load_profile(os.environ.get('HYPOTHESIS_PROFILE', 'ci' if os.environ.get('CI') else 'dev'))
+
+
+@pytest.fixture(scope='session')
+def curio_kernel():
+    """One curio kernel shared by every test, instead of starting a new one per example"""
+    with Kernel() as kernel:
+        yield kernel
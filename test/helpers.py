@@ -0,0 +1,7 @@
+"""Small helpers shared by the test modules"""
+from mock import MagicMock
+
+class AsyncMock(MagicMock):
+    """MagicMock whose calls are awaitable, for mocking out coroutines like `send_message`"""
+    async def __call__(self, *args, **kwargs):
+        return super(AsyncMock, self).__call__(*args, **kwargs)
@@ -1,23 +1,18 @@
 import pytest
 import os, sys
 import logging
-from asyncio import coroutine
 
 import smtplib
 from mock import Mock
 from mock import patch, call
 from mock import MagicMock
 from mock import PropertyMock
+from helpers import AsyncMock
 
 sys.modules['bleak'] = MagicMock()
 from  bricknil.process import Process
 from bricknil.sensor import TrainMotor
 
-class AsyncMock(MagicMock):
-    async def __call__(self, *args, **kwargs):
-        return super(AsyncMock, self).__call__(*args, **kwargs)
-
-
 class Testbricknil:
 
     def setup(self):
@@ -39,11 +34,19 @@ class Testbricknil:
         self.p.message_debug('hello')
         self.p.message_error('hello')
 
+    def test_message_args(self, caplog):
+        caplog.set_level(logging.DEBUG)
+        self.p.message('value %s', 5)
+        self.p.message('value %s', 6, level=logging.DEBUG)
+        self.p.message_error('value %s', 7)
+        assert [(r.levelno, r.getMessage()) for r in caplog.records] == [
+            (logging.INFO, 'value 5'), (logging.DEBUG, 'value 6'), (logging.ERROR, 'value 7')]
+
     @pytest.mark.curio
     #@patch('test_bricknil.TrainMotor.set_output', new_callable=AsyncMock)
     async def test_motor(self):
         m = TrainMotor('motor')
-        m.set_output = Mock(side_effect=coroutine(lambda x,y :'the awaitable should return this'))
+        m.set_output = AsyncMock(return_value='the awaitable should return this')
         await m.set_speed(10)
-        assert m.set_output.call_args == call(0, 10)
+        assert m.set_output.call_args == call(0, 10, True)
 
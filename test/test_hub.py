@@ -1,68 +1,68 @@
 import pytest
-import os, struct, copy, sys
-from functools import partial
-import logging, threading
-from asyncio import coroutine
-from curio import kernel, sleep, spawn, Event
-import time
+import sys
+from functools import lru_cache
+import threading
+from curio import kernel, spawn, Event, TaskGroup, UniversalQueue
 
 from mock import Mock
-from mock import patch, call, create_autospec
+from mock import patch
 from mock import MagicMock
-from mock import PropertyMock
+from helpers import AsyncMock
 
-from hypothesis import given, example, settings
+from hypothesis import given
 from hypothesis import strategies as st
 
 from bricknil.message_dispatch import MessageDispatch
-from bricknil.messages import UnknownMessageError, HubPropertiesMessage
 from bricknil.sensor import *
-from bricknil.const import DEVICES
-from bricknil import attach, start
+from bricknil import attach
 from bricknil.hub import PoweredUpHub, Hub, BoostHub, DuploTrainHub, PoweredUpRemote
 import bricknil
-import bricknil.const
 
+@lru_cache(maxsize=None)
+def _capability_strategy(sensor):
+    """Strategy for the capabilities list of `sensor`, built once per sensor class"""
+    if len(sensor.allowed_combo) > 0:
+        # test capabilities 1 by 1, 
+        # or some combination of those in the allowed_combo list
+        return st.one_of(
+                    st.lists(st.sampled_from([cap.name for cap in list(sensor.capability)]), min_size=1, max_size=1),
+                    st.lists(st.sampled_from(sensor.capability), min_size=1, max_size=1),
+                    st.lists(st.sampled_from(sensor.allowed_combo), min_size=1, unique=True)
+                )
+    else:
+        # if no combos allowed, then just test 1 by 1
+        return st.lists(st.sampled_from(sensor.capability), min_size=1, max_size=1)
 
 class TestSensors:
 
+    sensor_list = ( CurrentSensor,
+                    DuploSpeedSensor,
+                    VisionSensor,
+                    InternalTiltSensor,
+                    ExternalMotionSensor,
+                    ExternalTiltSensor,
+                    RemoteButtons,
+                    Button,
+                    DuploVisionSensor,
+                    VoltageSensor,
+    )
+    hub_list = ( PoweredUpHub, BoostHub, DuploTrainHub, PoweredUpRemote)
+
     def setup(self):
         # Create the main dispatch
         self.hub = MagicMock()
         self.m = MessageDispatch(self.hub)
-        self.sensor_list = [ CurrentSensor,
-                             DuploSpeedSensor,
-                             VisionSensor,
-                             InternalTiltSensor,
-                             ExternalMotionSensor,
-                             ExternalTiltSensor,
-                             RemoteButtons,
-                             Button,
-                             DuploVisionSensor,
-                             VoltageSensor,
-        ]
-        self.hub_list = [ PoweredUpHub, BoostHub, DuploTrainHub, PoweredUpRemote]
     
     def _with_header(self, msg:bytearray):
         l = len(msg)+2
         assert l<127
-        return bytearray([l, 0]+list(msg))
+        buf = bytearray(l)  # [length, 0 (hub id), msg...]
+        buf[0] = l
+        buf[2:] = msg
+        return buf
 
     def _draw_capabilities(self, data, sensor):
-        if len(sensor.allowed_combo) > 0:
-            # test capabilities 1 by 1, 
-            # or some combination of those in the allowed_combo list
-            capabilities = data.draw(
-                    st.one_of(
-                        st.lists(st.sampled_from([cap.name for cap in list(sensor.capability)]), min_size=1, max_size=1),
-                        st.lists(st.sampled_from(sensor.capability), min_size=1, max_size=1),
-                        st.lists(st.sampled_from(sensor.allowed_combo), min_size=1, unique=True)
-                    )
-                )
-        else:
-            # if no combos allowed, then just test 1 by 1
-            capabilities = data.draw(st.lists(st.sampled_from(sensor.capability), min_size=1, max_size=1))
-        return capabilities
+        return data.draw(_capability_strategy(sensor))
 
 
     def _get_hub_class(self, hub_type, sensor, sensor_name, capabilities):
@@ -111,44 +111,44 @@ class TestSensors:
              patch('bricknil.ble_queue.USE_BLEAK', False) as use_bleak:
             ble.return_value = MockBLE(hub)
             sensor_obj = getattr(hub, sensor_name)
-            sensor_obj.send_message = Mock(side_effect=coroutine(lambda x,y: "the awaitable should return this"))
-            kernel.run(self._emit_control, data, hub, stop_evt, ble(), sensor_obj)
+            # Signalled as soon as the sensor sends its activate updates message
+            activated = Event()
+            async def send_message(msg_name, msg_bytes, response=True):
+                if msg_name.startswith('Activate'):
+                    await activated.set()
+                return "the awaitable should return this"
+            sensor_obj.send_message = Mock(side_effect=send_message)
+            kernel.run(self._emit_control, data, hub, stop_evt, ble(), sensor_obj, activated)
             #start(system)
 
-    async def _wait_send_message(self, mock_call, msg):
-        print("in mock")
-        while not mock_call.call_args:
-            await sleep(0.01)
-        while not msg in mock_call.call_args[0][0]:
-            print(mock_call.call_args)
-            await sleep(0.01)
-
-    async def _emit_control(self, data, hub, hub_stop_evt, ble, sensor):
+    async def _emit_control(self, data, hub, hub_stop_evt, ble, sensor, activated):
         async def dummy():
             pass
-        system = await spawn(bricknil.bricknil._run_all(ble, dummy))
-        while not hub.peripheral_queue:
-            await sleep(0.1)
-        #await sleep(3)
+        # If the test fails part way, the group cancels the hub system too, so nothing
+        # is left running on the kernel for the next example
+        async with TaskGroup() as g:
+            await g.spawn(bricknil.bricknil._run_all, ble, dummy)
+            await g.spawn(self._drive_hub, data, hub, hub_stop_evt, sensor, activated)
+
+    async def _drive_hub(self, data, hub, hub_stop_evt, sensor, activated):
+        # The hub made its peripheral queue when it was constructed, and the queue holds
+        # the attach until the hub's message loop starts, so there is nothing to wait for
         port = data.draw(st.integers(0,254))
         await hub.peripheral_queue.put( ('attach', (port, sensor.sensor_name)) )
 
         # Now, make sure the sensor sent an activate updates message
-        if sensor.sensor_name == "Button":
-            await self._wait_send_message(sensor.send_message, 'Activate button')
-        else:
-            await self._wait_send_message(sensor.send_message, 'Activate SENSOR')
+        await activated.wait()
+        expected = 'Activate button' if sensor.sensor_name == "Button" else 'Activate SENSOR'
+        assert any(expected in args[0] for args, kwargs in sensor.send_message.call_args_list)
         # Need to generate a value on the port
         # if False:
-        msg = []
+        msg = bytearray()
         if len(sensor.capabilities) == 1:
             # Handle single capability
             for cap in sensor.capabilities:
                 n_datasets, byte_count = sensor.datasets[cap][0:2]
-                for i in range(n_datasets):
-                    for b in range(byte_count):
-                        msg.append(data.draw(st.integers(0,255)))
-            msg = bytearray(msg)
+                nbytes = n_datasets*byte_count
+                msg += data.draw(st.binary(min_size=nbytes, max_size=nbytes))
             await hub.peripheral_queue.put( ('value_change', (port, msg)))
         elif len(sensor.capabilities) > 1:
             modes = 1
@@ -156,14 +156,11 @@ class TestSensors:
             for cap_i, cap in enumerate(sensor.capabilities):
                 if modes & (1<<cap_i): 
                     n_datasets, byte_count = sensor.datasets[cap][0:2]
-                    for i in range(n_datasets):
-                        for b in range(byte_count):
-                            msg.append(data.draw(st.integers(0,255)))
-            msg = bytearray(msg)
+                    nbytes = n_datasets*byte_count
+                    msg += data.draw(st.binary(min_size=nbytes, max_size=nbytes))
             await hub.peripheral_queue.put( ('value_change', (port, msg)))
         
         await hub_stop_evt.set()
-        await system.join()
 
     @given(data = st.data())
     def test_run_hub_with_bleak(self, data):
@@ -185,7 +182,7 @@ class TestSensors:
         with patch('bricknil.bricknil.USE_BLEAK', True), \
              patch('bricknil.ble_queue.USE_BLEAK', True) as use_bleak:
             sensor_obj = getattr(hub, sensor_name)
-            sensor_obj.send_message = Mock(side_effect=coroutine(lambda x,y: "the awaitable should return this"))
+            sensor_obj.send_message = AsyncMock(return_value="the awaitable should return this")
             from bricknil.bleak_interface import Bleak
             ble = Bleak()
             # Run curio in a thread
@@ -193,8 +190,7 @@ class TestSensors:
 
             async def start_curio():
                 system = await spawn(bricknil.bricknil._run_all(ble, dummy))
-                while len(ble.devices) < 1 or not ble.devices[0].notify:
-                    await sleep(0.01)
+                await MockBleak.notified.get()   # The connected device has started notifications
                 await stop_evt.set()
                 print("sending quit")
                 await ble.in_queue.put( ('quit', ''))
@@ -211,25 +207,56 @@ class TestSensors:
             t.join()
 
 
+    def test_change_handlers(self):
+        @attach(TrainMotor, name='motor')
+        @attach(VisionSensor, name='busy', capabilities=['sense_color'])
+        @attach(VisionSensor, name='idle', capabilities=['sense_color'])
+        class TestHub(PoweredUpHub):
+            async def idle_change(self):
+                pass
+            async def busy_change(self):
+                self.changed = True
+        hub = TestHub('handler_hub')
+        # The motor has no handler at all, so nothing is registered for it
+        assert hub.change_handlers == {'busy': hub.busy_change, 'idle': hub.idle_change}
+
+    def test_change_handlers_bound_at_attach(self):
+        @attach(VisionSensor, name='vision', capabilities=['sense_color'])
+        class TestHub(PoweredUpHub):
+            async def vision_change(self):
+                pass
+        hub = TestHub('frozen_hub')
+        original = hub.change_handlers['vision']
+        async def patched():
+            pass
+        # Handlers are frozen when the peripheral is attached, so this one is never called
+        hub.vision_change = patched
+        assert hub.change_handlers['vision'] == original
+        assert hub.change_handlers['vision'] != hub.vision_change
 
 
 class MockBleak(MagicMock):
     def __init__(self, hub):
         MockBleak.hub = hub
-        pass
+        MockBleak.device = None   # New hub, so start with a fresh device
+        MockBleak.notified = UniversalQueue()  # Put on (from the asyncio side) when notify starts
+    
+    @classmethod
+    def _device(cls):
+        # Discovery and connection describe the same device, so only build it once
+        if cls.device is None:
+            cls.device = MockBleakDevice(cls.hub.uart_uuid, cls.hub.manufacturer_id)
+        return cls.device
+
     @classmethod
     async def discover(cls, timeout, loop):
         # Need to return devices here, which is a list of device tuples
-        hub = MockBleak.hub
-        devices = [MockBleakDevice(hub.uart_uuid, hub.manufacturer_id)]
-        return devices
+        return [cls._device()]
 
     @classmethod
     def BleakClient(cls, address, loop):
         print("starting BleakClient")
-        hub = MockBleak.hub
-        device = MockBleakDevice(hub.uart_uuid, hub.manufacturer_id)
-        return device
+        return cls._device()
 
 class MockBleakDevice:
     def __init__(self, uuid, manufacturer_id):
@@ -242,12 +269,13 @@ class MockBleakDevice:
     async def connect(self):
         self.characteristics = MockBleak.hub.char_uuid
         pass
-    async def write_gatt_char(self, char_uuid, msg_bytes):
+    async def write_gatt_char(self, char_uuid, msg_bytes, response=False):
         print(f'Got msg on {char_uuid}: {msg_bytes}')
 
     async def start_notify(self, char_uuid, handler):
         print("started notify")
         self.notify = True
+        await MockBleak.notified.put(True)
 
     async def disconnect(self):
         print("device disconnected")
@@ -1,19 +1,33 @@
 import pytest
-import os, struct, copy
-import logging
+import struct
+from functools import lru_cache
 
-from mock import Mock
-from mock import patch, call
 from mock import MagicMock
-from mock import PropertyMock
 
-from hypothesis import given, example, settings
+from hypothesis import given, example
 from hypothesis import strategies as st
 
 from bricknil.message_dispatch import MessageDispatch
-from bricknil.messages import UnknownMessageError, HubPropertiesMessage
+from bricknil.messages import HubPropertiesMessage
 from bricknil.const import DEVICES
 
+# Shared strategies, built once for the whole module
+_BYTE = st.integers(0,255)
+_PORT = _BYTE
+_DEV_IDS = st.sampled_from(sorted(DEVICES.keys()))
+# The hubs send each message in one notification, and the default BLE ATT MTU
+# leaves 20 bytes of it for the message (header included)
+_MAX_MSG_LEN = 20
+# Message type and field bytes at the front of each test message
+_PACK_BB = struct.Struct('<BB').pack
+_PACK_BBB = struct.Struct('<BBB').pack
+_PACK_INTO_BBB = struct.Struct('<BBB').pack_into
+_PACK_BBBB = struct.Struct('<BBBB').pack
+
+@lru_cache(maxsize=None)
+def _byte_strings(min_size, max_size):
+    return st.binary(min_size=min_size, max_size=max_size)
+
 class TestMessages:
 
     def setup(self):
@@ -24,43 +38,50 @@ class TestMessages:
     def _with_header(self, msg:bytearray):
         l = len(msg)+2
         assert l<127
-        return bytearray([l, 0]+list(msg))
+        buf = bytearray(l)  # [length, 0 (hub id), msg...]
+        buf[0] = l
+        buf[2:] = msg
+        return buf
 
     @given(st.data())
     def test_port_value_message(self, data):
-        port = data.draw(st.integers(0,255))
+        port = data.draw(_PORT)
         width = data.draw(st.integers(1,3))
         nbytes = 1<<(width-1)
-        values = data.draw(st.lists(st.integers(0,255),min_size=nbytes,max_size=nbytes ))
+        values = data.draw(_byte_strings(nbytes, nbytes))
         msg_type = 0x45
-        msg = bytearray([msg_type, port]+values)
+        msg = _PACK_BB(msg_type, port)+values
         l = self.m.parse(self._with_header(msg))
-        self.hub.peripheral_queue.put.assert_called_with(('value_change', (port,values)))
+        self.hub.peripheral_queue.put.assert_called_with(('value_change', (port,bytes(values))))
 
-    @given(port=st.integers(0,255),
+    @given(port=_PORT,
            mode_ptr=st.integers(0, 0xffff),
-           mode_data=st.lists(st.integers(0,255), min_size=1, max_size=100),
+           mode_data=_byte_strings(1, _MAX_MSG_LEN-6),  # header, msg type, port, mode pointer
     ) 
     def test_port_combo_value_message(self, port, mode_ptr, mode_data):
         msg_type = 0x46
         mptr = struct.pack('H', mode_ptr)
-        msg = bytearray([msg_type, int(port)])+mptr+bytearray(mode_data)
+        msg = _PACK_BB(msg_type, port)+mptr+mode_data
+        tail = bytes(msg[2:])
         l = self.m.parse(self._with_header(msg))
-        assert l==f'Port {port} changed combo value to {list(msg[2:])}'
-        self.hub.peripheral_queue.put.assert_called_with(('value_change', (port,list(msg[2:]))))
+        assert l==f'Port {port} changed combo value to {list(tail)}'
+        self.hub.peripheral_queue.put.assert_called_with(('value_change', (port,tail)))
 
-    @given(prop=st.integers(0,255),
-           op = st.integers(0,255),
-           msg_data=st.lists(st.integers(0,255), min_size=1, max_size=100),
+    @given(prop=_BYTE,
+           op = _BYTE,
+           msg_data=_byte_strings(1, _MAX_MSG_LEN-5),  # header, msg type, property, operation
     )
-    @example(prop=0, op=1, msg_data=[0])
-    @example(prop=0, op=0, msg_data=[0])
-    @example(prop=2, op=6, msg_data=[0])
+    # Regression pins for an unknown property, so they're checked on every run
+    @example(prop=0, op=1, msg_data=b'\x00')
+    @example(prop=0, op=0, msg_data=b'\x00')
+    # Button update (property 2, operation 6) is forwarded as a value change, and random
+    # draws only land on it once in 65536, so always check it
+    @example(prop=2, op=6, msg_data=b'\x00')
     def test_hub_properties_message(self, prop, op, msg_data):
         msg_type = 0x01
-        msg = bytearray([msg_type, prop, op]+msg_data)
+        msg = _PACK_BBB(msg_type, prop, op)+msg_data
         msg = self._with_header(msg)
-        msg_original = self.m._parse_msg_bytes(list(msg))
+        msg_original = self.m._parse_msg_bytes(msg)
 
         if prop not in list(range(1,16)):
             l = self.m.parse(msg)
@@ -71,39 +92,40 @@ class TestMessages:
                 assert l == f'Hub property:  {HubPropertiesMessage.prop_names[prop]} {msg_original}'
             else:
                 l = self.m.parse(msg)
-                remaining = self.m._parse_msg_bytes(list(msg[5:]))
+                payload = bytes(msg[5:])
                 if prop==0x02 and op==0x06:
-                    self.hub.peripheral_queue.put.assert_called_with(('value_change', (255,list(msg[5:]))))
+                    self.hub.peripheral_queue.put.assert_called_with(('value_change', (255,payload)))
                 else:
+                    remaining = self.m._parse_msg_bytes(payload)
                     assert l == f'Hub property:  {HubPropertiesMessage.prop_names[prop]} {HubPropertiesMessage.operation_names[op]} {remaining}'
 
 
     @given( event=st.integers(0,2),
-            port=st.integers(0,255),
+            port=_PORT,
             data=st.data()
     )
     def test_attach_message(self, data, port, event):
         msg_type = 0x04
-        msg = bytearray([msg_type, port, event])
+        msg = _PACK_BBB(msg_type, port, event)
         if event == 0: #detach
             l = self.m.parse(self._with_header(msg))
             assert l == f'Detached IO Port:{port}'
         elif event == 1: #attach
             # Need 10 bytes
-            #dev_id = data.draw(st.integers(0,255))
-            dev_id = data.draw(st.sampled_from(sorted(DEVICES.keys())))
-            fw_version = data.draw(st.lists(st.integers(0,255), min_size=8, max_size=8))
-            msg = msg + bytearray([dev_id, 0])+ bytearray(fw_version)
+            #dev_id = data.draw(_BYTE)
+            dev_id = data.draw(_DEV_IDS)
+            fw_version = data.draw(_byte_strings(8, 8))
+            msg = msg + _PACK_BB(dev_id, 0) + fw_version
             l = self.m.parse(self._with_header(msg))
             self.hub.peripheral_queue.put.assert_any_call(('update_port', (port, self.m.port_info[port])))
             self.hub.peripheral_queue.put.assert_any_call(('port_detected', port))
             # ALso need to make sure the port info is added to dispatch
             assert self.m.port_info[port]['name'] == DEVICES[dev_id]
         elif event == 2: # virtual attach
-            dev_id = data.draw(st.sampled_from(sorted(DEVICES.keys())))
-            v_port_a = data.draw(st.integers(0,255))
-            v_port_b = data.draw(st.integers(0,255))
-            msg = msg + bytearray([dev_id, 0, v_port_a, v_port_b])
+            dev_id = data.draw(_DEV_IDS)
+            v_port_a = data.draw(_BYTE)
+            v_port_b = data.draw(_BYTE)
+            msg = msg + _PACK_BBBB(dev_id, 0, v_port_a, v_port_b)
             l = self.m.parse(self._with_header(msg))
             self.hub.peripheral_queue.put.assert_any_call(('update_port', (port, self.m.port_info[port])))
             self.hub.peripheral_queue.put.assert_any_call(('port_detected', port))
@@ -112,17 +134,20 @@ class TestMessages:
             assert self.m.port_info[port]['name'] == DEVICES[dev_id]
 
     @given( mode = st.integers(1,2),
-            port = st.integers(0,255),
+            port = _PORT,
             data = st.data()
            )
     def test_port_information_message(self, data, port, mode):
         msg_type = 0x43
         if mode == 1:
             capabilities = data.draw(st.integers(0,15)) # bit mask of 4 bits
-            nmodes = data.draw(st.integers(0,255))
-            input_modes = [data.draw(st.integers(0,255)), data.draw(st.integers(0,255))]
-            output_modes = [data.draw(st.integers(0,255)), data.draw(st.integers(0,255))]
-            msg = bytearray([msg_type, port, mode, capabilities, nmodes]+input_modes+output_modes)
+            nmodes = data.draw(_BYTE)
+            input_modes = [data.draw(_BYTE), data.draw(_BYTE)]
+            output_modes = [data.draw(_BYTE), data.draw(_BYTE)]
+            msg = bytearray(9)
+            msg[0:5] = (msg_type, port, mode, capabilities, nmodes)
+            msg[5:7] = input_modes
+            msg[7:9] = output_modes
             l = self.m.parse(self._with_header(msg))
 
             self.hub.peripheral_queue.put.assert_any_call(('update_port', (port, self.m.port_info[port])))
@@ -147,8 +172,10 @@ class TestMessages:
             # Combination info
             # Up to 8x 16-bit words (bitmasks) of combinations possible
             ncombos = data.draw(st.integers(0,6))  # how many combos should we allow
-            combos = data.draw(st.lists(st.integers(0,255), min_size=ncombos*2, max_size=ncombos*2))
-            msg = bytearray([msg_type, port, mode]+combos+[0,0])
+            combos = data.draw(_byte_strings(ncombos*2, ncombos*2))
+            msg = bytearray(3+len(combos)+2)  # Last two bytes stay zero to end the combo list
+            _PACK_INTO_BBB(msg, 0, msg_type, port, mode)
+            msg[3:3+len(combos)] = combos
             l = self.m.parse(self._with_header(msg))
 
             self.hub.peripheral_queue.put.assert_any_call(('update_port', (port, self.m.port_info[port])))
@@ -158,45 +185,42 @@ class TestMessages:
             #assert len(combos)/2 == len(self.m.port_info[port]['mode_combinations'])
 
     @given(feedback=st.integers(0,32),
-           port=st.integers(0,255)
+           port=_PORT
     )
     def test_port_output_feedback_message(self, port, feedback):
         msg_type = 0x82
-        msg = bytearray([msg_type, port, feedback])
+        msg = _PACK_BBB(msg_type, port, feedback)
         self.m.parse(self._with_header(msg))
         
     @given(mode_type=st.sampled_from([0,1,2,3,4,5, 0x80]),#([0,1,2,3,4,5,0x80]),
-           mode=st.integers(0,255),
-           port=st.integers(0,255),
+           mode=_BYTE,
+           port=_PORT,
            data=st.data()
     )
-    @settings(deadline=None)
     def test_port_mode_info_message(self, port, mode, mode_type, data):
         msg_type = 0x44
 
         if mode_type == 0:
             name = data.draw(st.text(min_size=1, max_size=11))
-            payload = bytearray(name.encode('utf-8'))
+            payload = name.encode('utf-8')
         elif mode_type == 1 or mode_type == 2 or mode_type==3:
-            payload = data.draw(st.lists(st.integers(0,255), min_size=8, max_size=8))
-            payload = bytearray(payload)
+            payload = data.draw(_byte_strings(8, 8))
         elif mode_type == 4:
             name = data.draw(st.text(min_size=1, max_size=5))
-            payload = bytearray(name.encode('utf-8'))
+            payload = name.encode('utf-8')
         elif mode_type == 5:
-            payload = data.draw(st.lists(st.integers(0,255), min_size=2, max_size=2))
-            payload = bytearray(payload)
+            payload = data.draw(_byte_strings(2, 2))
         elif mode_type == 0x80:
-            ndatasets = data.draw(st.integers(0,255))
+            ndatasets = data.draw(_BYTE)
             dataset_type = data.draw(st.integers(0,3))
-            total_figures = data.draw(st.integers(0,255))
-            decimals = data.draw(st.integers(0,255))
-            payload = bytearray([ndatasets, dataset_type, total_figures, decimals])
+            total_figures = data.draw(_BYTE)
+            decimals = data.draw(_BYTE)
+            payload = _PACK_BBBB(ndatasets, dataset_type, total_figures, decimals)
             pass
         else:
             assert False
 
-        msg = bytearray([msg_type, port, mode, mode_type]) + payload
+        msg = _PACK_BBBB(msg_type, port, mode, mode_type) + payload
         self.m.parse(self._with_header(msg))
             
 
@@ -1,15 +1,10 @@
 import pytest
-import os, struct, copy
-import logging
-from asyncio import coroutine
-from curio import kernel, sleep
+import struct
+from curio import sleep, spawn
 
-from mock import Mock
-from mock import patch, call
-from mock import MagicMock
-from mock import PropertyMock
+from helpers import AsyncMock
 
-from hypothesis import given, example, settings
+from hypothesis import given, settings
 from hypothesis import strategies as st
 
 from bricknil.sensor.light import *
@@ -17,27 +12,26 @@ from bricknil.sensor.motor import *
 from bricknil.sensor.sound import *
 from bricknil.const import Color
 
-class AsyncMock(MagicMock):
-    async def __call__(self, *args, **kwargs):
-        return super(AsyncMock, self).__call__(*args, **kwargs)
-
 class DirectWrite:
     def get_bytes(self, port, mode, value):
-        return [0x00, 0x81, port, 0x01, 0x51, mode, value ]
+        return bytes([0x00, 0x81, port, 0x01, 0x51, mode, value ])
+
+    def _get_bytes_int32(self, port, subcmd, value, speed, max_power):
+        buf = bytearray(13)
+        struct.pack_into('<BBBBBiBBBB', buf, 0, 0x00, 0x81, port, 0x01, subcmd, value, speed, max_power, 126, 3)
+        return buf
 
     def get_bytes_for_set_pos(self, port, pos, speed, max_power):
-        abs_pos = list(struct.pack('i', pos))
-        return [0x00, 0x81, port, 0x01, 0x0d] + abs_pos + [speed, max_power, 126, 3]
+        return self._get_bytes_int32(port, 0x0d, pos, speed, max_power)
         
     def get_bytes_for_rotate(self, port, angle, speed, max_power):
-        angle = list(struct.pack('i',angle))
-        return [0x00, 0x81, port, 0x01, 0x0b] +  angle + [speed, max_power, 126, 3]
+        return self._get_bytes_int32(port, 0x0b, angle, speed, max_power)
 
 class TestLED:
 
     def setup(self):
         self.l = LED(name='led')
-        self.l.send_message = Mock(side_effect=coroutine(lambda x,y: "the awaitable should return this"))
+        self.l.send_message = AsyncMock(return_value="the awaitable should return this")
         self.write = DirectWrite()
 
     @pytest.mark.curio
@@ -53,18 +47,18 @@ class TestLight:
 
     def setup(self):
         self.l = Light(name='light')
-        self.l.send_message = Mock(side_effect=coroutine(lambda x,y: "the awaitable should return this"))
+        self.l.send_message = AsyncMock(return_value="the awaitable should return this")
         self.write = DirectWrite()
 
     @given( brightness = st.integers(0,100),
             port = st.integers(0,255)
     )
-    def test_set_brightness(self, port, brightness):
+    def test_set_brightness(self, curio_kernel, port, brightness):
         self.l.port = port
 
         async def child():
             await self.l.set_brightness(brightness)
-        kernel.run(child)
+        curio_kernel.run(child)
 
         self.l.send_message.ask_called_once()
         args, kwargs = self.l.send_message.call_args
@@ -74,18 +68,18 @@ class TestSpeaker:
 
     def setup(self):
         self.l = DuploSpeaker(name='light')
-        self.l.send_message = Mock(side_effect=coroutine(lambda x,y: "the awaitable should return this"))
+        self.l.send_message = AsyncMock(return_value="the awaitable should return this")
         self.write = DirectWrite()
 
     @given( sound = st.sampled_from(DuploSpeaker.sounds),
             port = st.integers(0,255)
     )
-    def test_play_sound(self, port, sound):
+    def test_play_sound(self, curio_kernel, port, sound):
         self.l.port = port
 
         async def child():
             await self.l.play_sound(sound)
-        kernel.run(child)
+        curio_kernel.run(child)
 
         self.l.send_message.ask_called_once()
         args, kwargs = self.l.send_message.call_args
@@ -93,47 +87,95 @@ class TestSpeaker:
 
     @given( port = st.integers(0,255)
     )
-    def test_activate_updates(self, port):
+    def test_activate_updates(self, curio_kernel, port):
         self.l.port = port
         async def child():
             await self.l.activate_updates()
-        kernel.run(child)
+        curio_kernel.run(child)
 
 class TestMotor:
 
     def setup(self):
         #self.m = TrainMotor(name='motor')
-        #self.m.send_message = Mock(side_effect=coroutine(lambda x,y: "the awaitable should return this"))
+        #self.m.send_message = AsyncMock(return_value="the awaitable should return this")
         self.write = DirectWrite()
-
-    def _create_motor(self, cls):
-        self.m = cls(name='motor')
-        self.m.send_message = Mock(side_effect=coroutine(lambda x,y: "the awaitable should return this"))
+        self._motors = {}   # One motor per class, reused across the Hypothesis examples of a test
+
+    def _create_motor(self, kernel, cls):
+        if cls not in self._motors:
+            m = cls(name='motor')
+            m.send_message = AsyncMock(return_value="the awaitable should return this")
+            self._motors[cls] = m
+        self.m = self._motors[cls]
+        # A ramp left running by the previous example would keep changing this motor
+        # on the shared kernel, so cancel it (and wait for it to finish) first
+        if self.m.ramp_in_progress_task:
+            kernel.run(self.m.ramp_in_progress_task.cancel)
+        # Start every example from the state of a freshly constructed motor
+        self.m.speed = 0
+        self.m.ramp_in_progress_task = None
+        self.m.send_message.reset_mock()
 
     @given( speed = st.integers(-100,100),
             port = st.integers(0,255),
             cls = st.sampled_from([TrainMotor, DuploTrainMotor, WedoMotor, 
                         ExternalMotor, InternalMotor])
     )
-    def test_set_speed(self, cls, port, speed):
-        self._create_motor(cls)
+    def test_set_speed(self, curio_kernel, cls, port, speed):
+        self._create_motor(curio_kernel, cls)
         self.m.port = port
 
         async def child():
             await self.m.set_speed(speed)
-        kernel.run(child)
+        curio_kernel.run(child)
 
         self.m.send_message.ask_called_once()
         args, kwargs = self.m.send_message.call_args
         assert args[1] == self.write.get_bytes(port, 0, self.m._convert_speed_to_val(speed))
+        assert kwargs['response']
+
+    def test_convert_speed_out_of_range(self):
+        m = TrainMotor(name='motor')
+        # Out of range speeds are clamped (-200 used to wrap around to 56, a forward speed)
+        for speed, val in [(101, 100), (150, 100), (-101, 156), (-200, 156), (-300, 156),
+                           (100, 100), (-100, 156), (127, 127)]:
+            assert m._convert_speed_to_val(speed) == val
+            assert Peripheral._convert_speed_to_val(m, speed) == val
+
+    @pytest.mark.curio
+    async def test_play_schedule_cancelled(self):
+        m = TrainMotor(name='motor')
+        m.port = 1
+        m.send_message = AsyncMock(return_value="the awaitable should return this")
+        player = await spawn(m.play_schedule([(50, 200, 300), (100, 200, 300)]))
+        await sleep(0.15)
+        # A speed change from another task stops the rest of the schedule
+        await m.set_speed(0)
+        await player.join()
+        assert m.speed == 0
+        assert m.ramp_in_progress_task is None
+        args, kwargs = m.send_message.call_args
+        assert args[1] == self.write.get_bytes(1, 0, 0)
+
+    @pytest.mark.curio
+    async def test_ramp_steps_skip_response(self):
+        m = TrainMotor(name='motor')
+        m.port = 1
+        m.send_message = AsyncMock(return_value="the awaitable should return this")
+        await m.ramp_speed(50, 300)
+        await m.ramp_in_progress_task.join()
+        # Only the final speed of the ramp waits for the BLE write response
+        responses = [kwargs['response'] for args, kwargs in m.send_message.call_args_list]
+        assert responses[-1]
+        assert not any(responses[:-1])
 
     @given( speed = st.integers(-100,100),
             port = st.integers(0,255),
             cls = st.sampled_from([TrainMotor, DuploTrainMotor, WedoMotor, 
                         ExternalMotor, InternalMotor])
     )
-    def test_ramp_speed(self, cls, port, speed):
-        self._create_motor(cls)
+    def test_ramp_speed(self, curio_kernel, cls, port, speed):
+        self._create_motor(curio_kernel, cls)
         self.m.port = port
 
         async def child():
@@ -143,15 +185,34 @@ class TestMotor:
             t = await spawn(child())
             await t.join()
             assert self.m.speed == speed
-        kernel.run(main)
+        curio_kernel.run(main)
+
+    @given( speed = st.integers(-100,100),
+            port = st.integers(0,255),
+            cls = st.sampled_from([TrainMotor, DuploTrainMotor, WedoMotor, 
+                        ExternalMotor, InternalMotor])
+    )
+    @settings(max_examples=5)   # Each example really sleeps through the schedule
+    def test_play_schedule(self, curio_kernel, cls, port, speed):
+        self._create_motor(curio_kernel, cls)
+        self.m.port = port
+
+        async def main():
+            await self.m.play_schedule([(speed//2, 200, 300), (speed, 200, 300)])
+            # The schedule's ramp task is done by the time play_schedule returns
+            assert self.m.ramp_in_progress_task is None
+            assert self.m.speed == speed
+            args, kwargs = self.m.send_message.call_args
+            assert args[1] == self.write.get_bytes(port, 0, self.m._convert_speed_to_val(speed))
+        curio_kernel.run(main)
 
     @given( speed = st.sampled_from([-50,0,100]),
             port = st.integers(0,255),
             cls = st.sampled_from([TrainMotor, DuploTrainMotor, WedoMotor, 
                         ExternalMotor, InternalMotor])
     )
-    def test_ramp_cancel_speed(self, cls, port, speed):
-        self._create_motor(cls)
+    def test_ramp_cancel_speed(self, curio_kernel, cls, port, speed):
+        self._create_motor(curio_kernel, cls)
         self.m.port = port
 
         async def child():
@@ -163,14 +224,14 @@ class TestMotor:
             t = await spawn(child())
             await t.join()
             assert self.m.speed == speed+10
-        kernel.run(main)
+        curio_kernel.run(main)
 
     @given( pos = st.integers(-2147483648, 2147483647),
             port = st.integers(0,255),
             cls = st.sampled_from([ExternalMotor, InternalMotor])
     )
-    def test_set_pos(self, cls, port, pos):
-        self._create_motor(cls)
+    def test_set_pos(self, curio_kernel, cls, port, pos):
+        self._create_motor(curio_kernel, cls)
         self.m.port = port
         speed = 50
         max_power = 50
@@ -181,7 +242,7 @@ class TestMotor:
         async def main():
             t = await spawn(child())
             await t.join()
-        kernel.run(main)
+        curio_kernel.run(main)
 
         args, kwargs = self.m.send_message.call_args
         assert args[1] == self.write.get_bytes_for_set_pos(port, pos, self.m._convert_speed_to_val(speed), max_power)
@@ -191,8 +252,8 @@ class TestMotor:
             port = st.integers(0,255),
             cls = st.sampled_from([ExternalMotor, InternalMotor])
     )
-    def test_rotate(self, cls, port, angle, speed):
-        self._create_motor(cls)
+    def test_rotate(self, curio_kernel, cls, port, angle, speed):
+        self._create_motor(curio_kernel, cls)
         self.m.port = port
         max_power = 50
 
@@ -202,7 +263,7 @@ class TestMotor:
         async def main():
             t = await spawn(child())
             await t.join()
-        kernel.run(main)
+        curio_kernel.run(main)
 
         args, kwargs = self.m.send_message.call_args
         assert args[1] == self.write.get_bytes_for_rotate(port, angle, self.m._convert_speed_to_val(speed), max_power)
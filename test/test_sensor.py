@@ -0,0 +1,118 @@
+import pytest
+import struct
+from itertools import product
+
+from helpers import AsyncMock
+
+from bricknil.sensor.sensor import *
+
+async def _activated(cls, capabilities, port=1):
+    """Create a sensor and run its activate_updates, with the outgoing messages mocked"""
+    sensor = cls(name='sensor', capabilities=capabilities)
+    sensor.port = port
+    sensor.send_message = AsyncMock(return_value="the awaitable should return this")
+    await sensor.activate_updates()
+    return sensor
+
+class TestActivateUpdates:
+
+    @pytest.mark.curio
+    async def test_single(self):
+        s = await _activated(VisionSensor, ['sense_color'], port=3)
+        assert s.value == {VisionSensor.capability.sense_color: [None]}
+        args, kwargs = s.send_message.call_args
+        assert args[0].startswith('Activate SENSOR')
+        # Port input format setup: mode 0, delta 1, notifications on
+        assert args[1] == bytes([0x00, 0x41, 3, 0, 1,0,0,0, 1])
+
+    @pytest.mark.curio
+    async def test_combined(self):
+        s = await _activated(DuploSpeedSensor, ['sense_speed', 'sense_count'], port=3)
+        speed, count = DuploSpeedSensor.capability.sense_speed, DuploSpeedSensor.capability.sense_count
+        assert s.value == {speed: [None], count: [None]}
+        sent = [args[1] for args, kwargs in s.send_message.call_args_list]
+        assert sent == [ bytes([0x00, 0x42, 3, 0x02]),                # lock
+                         bytes([0x00, 0x41, 3, 0, 1,0,0,0, 1]),       # enable speed
+                         bytes([0x00, 0x41, 3, 1, 1,0,0,0, 1]),       # enable count
+                         bytes([0x00, 0x42, 3, 0x01, 0x00, 0x00, 0x10]),  # report order
+                         bytes([0x00, 0x42, 3, 0x03]),                # unlock
+                       ]
+
+    @pytest.mark.curio
+    async def test_button(self):
+        s = await _activated(Button, ['sense_press'])
+        assert s.value == {Button.capability.sense_press: [None]}
+        args, kwargs = s.send_message.call_args
+        assert args[1] == bytes([0x00, 0x01, 0x02, 0x02])
+
+class TestSignedValues:
+
+    @pytest.mark.curio
+    async def test_single_mode(self):
+        s = await _activated(ExternalTiltSensor, ['sense_angle'])
+        angle = ExternalTiltSensor.capability.sense_angle
+        await s.update_value(bytes([0x2d, 0xd3]))
+        assert s.value[angle] == [45, -45]
+        await s.update_value(bytes([0xff, 0x80]))
+        assert s.value[angle] == [-1, -128]
+
+        s = await _activated(DuploSpeedSensor, ['sense_speed'])
+        await s.update_value(struct.pack('<h', -300))
+        assert s.value[DuploSpeedSensor.capability.sense_speed] == -300
+
+    @pytest.mark.curio
+    async def test_combined_mode(self):
+        s = await _activated(DuploSpeedSensor, ['sense_speed', 'sense_count'])
+        speed, count = DuploSpeedSensor.capability.sense_speed, DuploSpeedSensor.capability.sense_count
+        await s.update_value(bytes([0x00, 0b11]) + struct.pack('<hi', -120, -5))
+        assert s.value[speed] == -120
+        assert s.value[count] == -5
+        # A speed-only update leaves the stored count exactly as it was
+        await s.update_value(bytes([0x00, 0b01]) + struct.pack('<h', 250))
+        assert s.value[speed] == 250
+        assert s.value[count] == -5
+
+class TestCapabilities:
+
+    def test_mixed_thresholds(self):
+        cap = VisionSensor.capability
+        caps, thresholds = VisionSensor._get_validated_capabilities(
+            [('sense_rgb', 5), 'sense_color', 3, (cap.sense_distance, 2), cap.sense_count])
+        # The invalid entry (3) is skipped along with its threshold, so the lists stay aligned
+        assert caps == [cap.sense_rgb, cap.sense_color, cap.sense_distance, cap.sense_count]
+        assert thresholds == [5, 1, 2, 1]
+
+    def test_unknown_name(self):
+        with pytest.raises(KeyError):
+            VisionSensor._get_validated_capabilities(['sense_color', ('sense_nothing', 2)])
+
+    @pytest.mark.curio
+    async def test_combined_sparse_mask(self):
+        s = await _activated(VisionSensor, ['sense_color', 'sense_distance', 'sense_rgb'])
+        cap = VisionSensor.capability
+        # Mode bits are color, distance, then one per rgb dataset: only color, red and blue here
+        await s.update_value(bytes([0x00, 0b10101, 7]) + struct.pack('<HH', 300, 500))
+        assert s.value[cap.sense_color] == 7
+        assert s.value[cap.sense_rgb] == [300, None, 500]
+        assert s.value[cap.sense_distance] == [None]
+
+class TestRemoteButtons:
+
+    def setup(self):
+        self.s = RemoteButtons(name='buttons', port=RemoteButtons.Port.L)
+        self.cap = RemoteButtons.capability.sense_press
+
+    def test_pressed_mask(self):
+        for plus, red, minus in product([0, 1], repeat=3):
+            self.s.value = {self.cap: [plus, red, minus]}
+            mask = self.s.pressed_mask()
+            assert mask == plus*RemoteButtons.MASK_PLUS | red*RemoteButtons.MASK_RED | minus*RemoteButtons.MASK_MINUS
+            # Agrees with the single button helpers
+            assert bool(mask & RemoteButtons.MASK_PLUS) == self.s.plus_pressed()
+            assert bool(mask & RemoteButtons.MASK_RED) == self.s.red_pressed()
+            assert bool(mask & RemoteButtons.MASK_MINUS) == self.s.minus_pressed()
+
+    def test_pressed_mask_no_value(self):
+        # Before the remote reports anything, nothing is pressed
+        self.s.value = {self.cap: [None, None, None]}
+        assert self.s.pressed_mask() == 0
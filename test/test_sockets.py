@@ -0,0 +1,73 @@
+import pytest
+from curio import Queue
+
+from mock import MagicMock
+
+from bricknil.sockets import WebClient, WebMessage
+from bricknil.sensor import VisionSensor
+
+class TestWebValues:
+
+    def setup(self):
+        self.hub = MagicMock()
+        self.hub.name = 'hub'
+        self.sensor = VisionSensor(name='sensor', capabilities=['sense_color'])
+        self.sensor.port = 1
+        self.cap = VisionSensor.capability.sense_color
+
+    async def _value(self, value):
+        """Run a value through WebMessage and return the (key, msg) it queues"""
+        self.hub.web_queue_out = Queue()
+        await WebMessage(self.hub).send_value(self.sensor, self.cap, value)
+        return await self.hub.web_queue_out.get()
+
+    async def _drain(self, wc):
+        msgs = []
+        while not wc.out_queue.empty():
+            msgs.append(await wc.out_queue.get())
+        return msgs
+
+    @pytest.mark.curio
+    async def test_send_value(self):
+        key, msg = await self._value(3)
+        assert key == ('hub', 'sensor', self.cap)
+        assert msg.endswith(b'"message":"value change mode: 0 = 3"}\n')
+
+    @pytest.mark.curio
+    async def test_unchanged_value_skipped(self):
+        wc = WebClient(MagicMock(), 'addr')
+        three, four = await self._value(3), await self._value(4)
+        await wc.put(*three)
+        await wc.put(*three)    # Repeat of what's already queued
+        assert await self._drain(wc) == [three]
+        await wc.put(*three)    # Still what the client last got
+        await wc.put(*four)
+        await wc.put(*three)    # Changed back, so it has to go out again
+        assert await self._drain(wc) == [four, three]
+        # Messages that aren't values are never skipped
+        await wc.put(None, b'attach\n')
+        await wc.put(None, b'attach\n')
+        assert await self._drain(wc) == [(None, b'attach\n')]*2
+
+    @pytest.mark.curio
+    async def test_dropped_value_resent(self):
+        wc = WebClient(MagicMock(), 'addr')
+        wc.out_queue = Queue(maxsize=1)
+        three = await self._value(3)
+        await wc.put(*three)
+        await wc.put(None, b'attach\n')   # Queue full, so the value gets dropped
+        await wc.put(*three)              # and is sent again on the next report
+        assert await self._drain(wc) == [three]
+
+    @pytest.mark.curio
+    async def test_new_client_gets_value(self):
+        three = await self._value(3)
+        wc = WebClient(MagicMock(), 'addr')
+        await wc.put(*three)
+        await self._drain(wc)
+        # A client that connects later still gets the current value on its next report
+        late = WebClient(MagicMock(), 'addr')
+        await wc.put(*three)
+        await late.put(*three)
+        assert await self._drain(wc) == []
+        assert await self._drain(late) == [three]